@@ -0,0 +1,31 @@
+"""
+Add full-text search column on document_embeddings.chunk_text
+
+Backs the lexical half of hybrid retrieval: a tsvector column filled from
+chunk_text, with a GIN index.
+
+Revision ID: add_chunk_tsvector
+Revises: add_embedding_domain_id
+Create Date: 2025-09-10
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'add_chunk_tsvector'
+down_revision = 'add_embedding_domain_id'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('document_embeddings', sa.Column('chunk_tsv', postgresql.TSVECTOR(), nullable=True))
+    op.execute("UPDATE document_embeddings SET chunk_tsv = to_tsvector('english', chunk_text);")
+    op.create_index(
+        'ix_document_embeddings_chunk_tsv', 'document_embeddings', ['chunk_tsv'], postgresql_using='gin'
+    )
+
+def downgrade():
+    op.drop_index('ix_document_embeddings_chunk_tsv', table_name='document_embeddings')
+    op.drop_column('document_embeddings', 'chunk_tsv')
@@ -0,0 +1,52 @@
+"""
+Add compact HNSW indexes for coarse vector search
+
+Expression indexes over document_embeddings.vector, so no new column has to be
+backfilled or kept in sync by ingest:
+- halfvec: vector::halfvec(768) with halfvec_l2_ops (half the size of the vector index)
+- binary: binary_quantize(vector)::bit(768) with bit_hamming_ops (1 bit per dimension)
+VECTOR_COMPACT_INDEXES picks which to build (default "halfvec,binary"). They serve
+VECTOR_SEARCH_PRECISION=halfvec|binary in vector_search, which re-ranks the candidates
+at full precision from the heap. Once a compact mode is in use, ix_document_embeddings_vector
+can be dropped to reclaim its memory. Needs pgvector >= 0.7.
+
+Revision ID: add_compact_vector_indexes
+Revises: add_listing_indexes
+Create Date: 2025-09-30
+"""
+
+import os
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_compact_vector_indexes'
+down_revision = 'add_listing_indexes'
+branch_labels = None
+depends_on = None
+
+DIM = 768
+INDEXES = {
+    'halfvec': ('ix_document_embeddings_vector_halfvec', f'((vector::halfvec({DIM})) halfvec_l2_ops)'),
+    'binary': ('ix_document_embeddings_vector_binary', f'((binary_quantize(vector)::bit({DIM})) bit_hamming_ops)'),
+}
+
+def upgrade():
+    kinds = [k.strip().lower() for k in os.getenv('VECTOR_COMPACT_INDEXES', 'halfvec,binary').split(',') if k.strip()]
+    unknown = set(kinds) - set(INDEXES)
+    if unknown:
+        raise ValueError(f"Unsupported VECTOR_COMPACT_INDEXES {sorted(unknown)} (expected halfvec and/or binary)")
+    m = int(os.getenv('HNSW_M', '16'))
+    ef_construction = int(os.getenv('HNSW_EF_CONSTRUCTION', '64'))
+    # Build without blocking writes on a live table
+    with op.get_context().autocommit_block():
+        for kind in kinds:
+            name, expression = INDEXES[kind]
+            op.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON document_embeddings '
+                f'USING hnsw {expression} WITH (m = {m}, ef_construction = {ef_construction});'
+            )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _ in INDEXES.values():
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name};')
@@ -0,0 +1,39 @@
+"""
+Content-addressed embedding cache
+
+Adds documents.content_hash (sha256 of the raw upload), document_embeddings.chunk_hash
+(sha256 of embedding model + chunk text) and the embedding_cache table that maps chunk
+hashes to vectors, so identical files and repeated chunks are not re-embedded.
+
+Revision ID: add_content_hashes
+Revises: add_chunk_tsvector
+Create Date: 2025-09-16
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+# revision identifiers, used by Alembic.
+revision = 'add_content_hashes'
+down_revision = 'add_chunk_tsvector'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('documents', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_documents_content_hash', 'documents', ['content_hash'])
+    op.add_column('document_embeddings', sa.Column('chunk_hash', sa.String(length=64), nullable=True))
+    op.create_table('embedding_cache',
+    sa.Column('chunk_hash', sa.String(length=64), nullable=False),
+    sa.Column('model', sa.String(), nullable=False),
+    sa.Column('vector', Vector(768), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('chunk_hash')
+    )
+
+def downgrade():
+    op.drop_table('embedding_cache')
+    op.drop_column('document_embeddings', 'chunk_hash')
+    op.drop_index('ix_documents_content_hash', table_name='documents')
+    op.drop_column('documents', 'content_hash')
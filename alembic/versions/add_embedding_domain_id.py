@@ -0,0 +1,35 @@
+"""
+Denormalize domain_id onto document_embeddings
+
+Lets vector_search filter by domain without joining documents, with a
+btree index so domain-scoped searches only touch that domain's rows.
+
+Revision ID: add_embedding_domain_id
+Revises: add_vector_ann_index
+Create Date: 2025-09-04
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_embedding_domain_id'
+down_revision = 'add_vector_ann_index'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('document_embeddings', sa.Column('domain_id', sa.UUID(), nullable=True))
+    op.create_foreign_key(
+        'fk_document_embeddings_domain_id', 'document_embeddings', 'domains', ['domain_id'], ['id']
+    )
+    op.execute(
+        'UPDATE document_embeddings e SET domain_id = d.domain_id '
+        'FROM documents d WHERE e.document_id = d.id;'
+    )
+    op.create_index('ix_document_embeddings_domain_id', 'document_embeddings', ['domain_id', 'document_id'])
+
+def downgrade():
+    op.drop_index('ix_document_embeddings_domain_id', table_name='document_embeddings')
+    op.drop_constraint('fk_document_embeddings_domain_id', 'document_embeddings', type_='foreignkey')
+    op.drop_column('document_embeddings', 'domain_id')
@@ -0,0 +1,26 @@
+"""
+Track incremental ingest jobs on documents
+
+documents.ingest_incremental is set when a new version of a document's file is queued,
+so a retried or restart-recovered job re-ingests incrementally instead of deleting all
+of the document's chunks first.
+
+Revision ID: add_ingest_incremental
+Revises: normalize_stored_embeddings
+Create Date: 2025-10-10
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_ingest_incremental'
+down_revision = 'normalize_stored_embeddings'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('documents', sa.Column('ingest_incremental', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+def downgrade():
+    op.drop_column('documents', 'ingest_incremental')
@@ -0,0 +1,31 @@
+"""
+Indexes for keyset-paginated listings
+
+Composite (timestamp, id) indexes back the newest-first cursor pagination of
+documents and escalations; a GIN index on documents.tags serves tag filters.
+
+Revision ID: add_listing_indexes
+Revises: add_content_hashes
+Create Date: 2025-09-23
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_listing_indexes'
+down_revision = 'add_content_hashes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index('ix_documents_uploaded_at_id', 'documents', ['uploaded_at', 'id'])
+    op.create_index('ix_documents_domain_uploaded_at_id', 'documents', ['domain_id', 'uploaded_at', 'id'])
+    op.create_index('ix_documents_tags', 'documents', ['tags'], postgresql_using='gin')
+    op.create_index('ix_escalations_created_at_id', 'escalations', ['created_at', 'id'])
+
+def downgrade():
+    op.drop_index('ix_escalations_created_at_id', table_name='escalations')
+    op.drop_index('ix_documents_tags', table_name='documents')
+    op.drop_index('ix_documents_domain_uploaded_at_id', table_name='documents')
+    op.drop_index('ix_documents_uploaded_at_id', table_name='documents')
@@ -0,0 +1,40 @@
+"""
+Add ANN index on document_embeddings.vector
+
+HNSW by default; set VECTOR_INDEX_TYPE=ivfflat to build an IVFFlat index instead.
+Uses vector_l2_ops to match the l2_distance ordering in vector_search.
+
+Revision ID: add_vector_ann_index
+Revises: update_vector_dim_768
+Create Date: 2025-09-02
+"""
+
+import os
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'add_vector_ann_index'
+down_revision = 'update_vector_dim_768'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = 'ix_document_embeddings_vector'
+
+def upgrade():
+    index_type = os.getenv('VECTOR_INDEX_TYPE', 'hnsw').lower()
+    if index_type == 'ivfflat':
+        lists = int(os.getenv('IVFFLAT_LISTS', '100'))
+        using = f'ivfflat (vector vector_l2_ops) WITH (lists = {lists})'
+    elif index_type == 'hnsw':
+        m = int(os.getenv('HNSW_M', '16'))
+        ef_construction = int(os.getenv('HNSW_EF_CONSTRUCTION', '64'))
+        using = f'hnsw (vector vector_l2_ops) WITH (m = {m}, ef_construction = {ef_construction})'
+    else:
+        raise ValueError(f"Unsupported VECTOR_INDEX_TYPE '{index_type}' (expected hnsw or ivfflat)")
+    # Build without blocking writes on a live table
+    with op.get_context().autocommit_block():
+        op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} ON document_embeddings USING {using};')
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME};')
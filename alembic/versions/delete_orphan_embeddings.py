@@ -0,0 +1,26 @@
+"""
+Delete orphaned document embeddings
+
+Deleting a document used to NULL document_embeddings.document_id instead of removing
+the chunks, and search filters on domain_id alone, so those chunks kept appearing in
+answers. delete_document now removes them; this clears the ones already left behind.
+
+Revision ID: delete_orphan_embeddings
+Revises: add_compact_vector_indexes
+Create Date: 2025-10-03
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'delete_orphan_embeddings'
+down_revision = 'add_compact_vector_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.execute('DELETE FROM document_embeddings WHERE document_id IS NULL;')
+
+def downgrade():
+    # Deleted rows cannot be restored
+    pass
@@ -0,0 +1,30 @@
+"""
+Normalize stored embeddings to unit length
+
+Chunks embedded through /api/embed are unit-length, while the /api/embeddings fallback,
+queries and rows stored before batched embedding were raw, so l2_distance mixed scales.
+All vectors are now normalized on the way in; this rescales the existing rows in place
+(normalizing a raw vector gives the same vector /api/embed returns), so no re-embedding
+is needed. Rewrites every row and its index entries: run in a maintenance window on
+large tables. Needs pgvector >= 0.7 for l2_normalize.
+
+Revision ID: normalize_stored_embeddings
+Revises: delete_orphan_embeddings
+Create Date: 2025-10-08
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'normalize_stored_embeddings'
+down_revision = 'delete_orphan_embeddings'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.execute('UPDATE document_embeddings SET vector = l2_normalize(vector) WHERE vector IS NOT NULL;')
+    op.execute('UPDATE embedding_cache SET vector = l2_normalize(vector) WHERE vector IS NOT NULL;')
+
+def downgrade():
+    # Original magnitudes are not kept; unit vectors rank identically under cosine distance
+    pass
@@ -2,8 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.database import get_db
 from app.utils import crud
+from app.utils.logging import log_action
 from app.db import schemas
-from app.utils.security import verify_password, get_password_hash, create_access_token
+from app.utils.security import verify_password_async, hash_password_async, create_access_token, role_resolver, JWT_EMBED_PERMISSIONS, JWT_ROLE_CLAIMS_TTL
 from typing import Any
 
 router = APIRouter()
@@ -14,13 +15,13 @@ async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_db))
     db_user = await crud.get_user_by_email(db, user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    user.password = get_password_hash(user.password)
+    user.password = await hash_password_async(user.password)
     return await crud.create_user(db, user)
 
 @router.post("/login")
 async def login(form_data: schemas.UserLogin, db: AsyncSession = Depends(get_db)) -> Any:
     db_user = await crud.get_user_by_email(db, form_data.email)
-    if not db_user or not verify_password(form_data.password, getattr(db_user, "password_hash", "")):
+    if not db_user or not await verify_password_async(form_data.password, getattr(db_user, "password_hash", "")):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     role_id_value = db_user.role_id
     # If role_id is a UUID, convert to string; if None, keep as None
@@ -28,10 +29,19 @@ async def login(form_data: schemas.UserLogin, db: AsyncSession = Depends(get_db)
         role_id_str = str(role_id_value)
     else:
         role_id_str = None
-    access_token = create_access_token({
+    claims = {
         "sub": str(db_user.id),
         "role": role_id_str
-    })
+    }
+    expires_in = None
+    if JWT_EMBED_PERMISSIONS and role_id_str:
+        role = await role_resolver.resolve(role_id_str, db)
+        claims["role_name"] = role.get("name")
+        claims["permissions"] = role.get("permissions")
+        # Embedded permissions are a snapshot: expire them so a demotion takes effect
+        expires_in = JWT_ROLE_CLAIMS_TTL
+    access_token = create_access_token(claims, expires_in)
+    await log_action(str(db_user.id), "login", str(db_user.id))
     return {"access_token": access_token, "token_type": "bearer"}
 
 # Password reset endpoint
@@ -41,7 +51,7 @@ from pydantic import BaseModel
 # Pydantic model for email request
 class EmailRequest(BaseModel):
     email: str
-from app.utils.security import create_access_token, get_password_hash
+from app.utils.security import create_access_token
 
 @router.post("/password-reset-request")
 async def password_reset_request(request: EmailRequest, db: AsyncSession = Depends(get_db)):
@@ -76,6 +86,7 @@ async def password_reset_confirm(token: str = Body(...), new_password: str = Bod
     user = await crud.get_user_by_id(db, str(user_id))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    hashed_pw = get_password_hash(new_password)
+    hashed_pw = await hash_password_async(new_password)
     await crud.update_user_password(db, str(user_id), hashed_pw)
+    await log_action(str(user_id), "password_reset", str(user_id))
     return {"msg": "Password reset successful"}
@@ -1,16 +1,25 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Form
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Form, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.database import get_db
+from app.db.database import get_db, get_read_db
 from app.utils import crud
+from app.utils.logging import log_action
 from app.db import schemas
 from app.utils.security import get_current_user, require_admin
-from app.services.ingest_pipeline import ingest_document
-from typing import List, Any
+from app.services.ingest_jobs import (
+    save_upload, enqueue_ingest, find_upload, parse_manifest, open_bulk_archive, save_bulk_files, BULK_MAX_FILES
+)
+from app.services.cache import answer_cache
+from typing import List, Any, Literal, Optional
+import os
+import uuid
+import asyncio
+import zipfile
 
 router = APIRouter()
 
-@router.post("/upload", response_model=schemas.Document)
+@router.post("/upload", response_model=schemas.IngestJob, status_code=202)
 async def upload_document(
     title: str = Form(...),
     domain_name: str = Form(...),
@@ -33,19 +42,161 @@ async def upload_document(
     user_id = getattr(current_user, "id", None)
     if user_id is None and isinstance(current_user, dict):
         user_id = current_user.get("id")
-    doc = Document(title=title, content="", domain_id=domain_id, uploaded_by=user_id, tags=tags, file_type=file_type, status="uploaded")
+    doc = Document(title=title, content="", domain_id=domain_id, uploaded_by=user_id, tags=tags, file_type=file_type, status="queued")
     db.add(doc)
     await db.commit()
-    await db.refresh(doc)
-    # Chunk, embed, and store in vector DB
-    await ingest_document(db, doc, file)
-    return doc
+    # Save the file and hand chunking, embedding and storage to an ingest worker
+    path = await save_upload(file, str(doc.id))
+    await enqueue_ingest(str(doc.id), path, str(user_id) if user_id else None)
+    return {"job_id": doc.id, "document_id": doc.id, "status": doc.status}
+
+
+# Bulk upload: many files and/or a zip archive, with optional manifest metadata per filename.
+# Each accepted file becomes its own ingest job; failures are reported per file.
+@router.post("/upload/bulk", response_model=schemas.BulkUploadResult, status_code=202)
+async def bulk_upload_documents(
+    domain_name: str = Form(...),
+    files: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    manifest: Optional[str] = Form(None),
+    current_user: schemas.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> Any:
+    await require_admin(current_user, db)
+    from app.db.models import Document, Domain
+    domain = (await db.execute(select(Domain).where(Domain.name == domain_name))).scalar_one_or_none()
+    if not domain:
+        raise HTTPException(status_code=400, detail=f"Domain '{domain_name}' not found.")
+    if not files and archive is None:
+        raise HTTPException(status_code=400, detail="No files or archive provided.")
+
+    sources = [(f.filename or "", f) for f in files or []]
+    zip_file, metadata = None, {}
+    try:
+        if archive is not None:
+            zip_file, metadata, members = await asyncio.to_thread(open_bulk_archive, archive.file)
+            sources += [(info.filename, info) for info in members]
+        if manifest:
+            metadata = parse_manifest(manifest)
+    except (zipfile.BadZipFile, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(sources) > BULK_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_FILES} files per request.")
+
+    user_id = current_user.get("id") if isinstance(current_user, dict) else getattr(current_user, "id", None)
+    items: List[dict] = []
+    docs, entries = [], []
+    for name, source in sources:
+        filename = os.path.basename(name)
+        if not filename:
+            items.append({"filename": name, "document_id": None, "status": "failed", "error": "Missing filename"})
+            continue
+        meta = metadata.get(filename) or metadata.get(name) or {}
+        doc = Document(
+            id=uuid.uuid4(), title=meta.get("title") or os.path.splitext(filename)[0], content="",
+            domain_id=domain.id, uploaded_by=user_id, tags=meta.get("tags"),
+            file_type=meta.get("file_type", ""), status="queued"
+        )
+        docs.append(doc)
+        entries.append((str(doc.id), filename, source))
+    # One INSERT round trip for all Document rows
+    db.add_all(docs)
+    await db.commit()
+
+    try:
+        saved = await asyncio.to_thread(save_bulk_files, entries, zip_file)
+    finally:
+        if zip_file is not None:
+            zip_file.close()
+    for doc, (document_id, filename, _), result in zip(docs, entries, saved):
+        if isinstance(result, Exception):
+            setattr(doc, "status", "failed")
+            items.append({"filename": filename, "document_id": doc.id, "status": "failed", "error": str(result)})
+        else:
+            items.append({"filename": filename, "document_id": doc.id, "status": "queued", "error": None})
+    await db.commit()
+    for doc, (document_id, _, _), result in zip(docs, entries, saved):
+        if not isinstance(result, Exception):
+            await enqueue_ingest(document_id, result, str(user_id) if user_id else None)
+    failed = sum(1 for item in items if item["status"] == "failed")
+    return {"domain_id": domain.id, "accepted": len(items) - failed, "failed": failed, "items": items}
+
+
+# Ingestion job status (job id is the document id)
+@router.get("/jobs/{job_id}", response_model=schemas.IngestJob)
+async def get_ingest_job(job_id: str, db: AsyncSession = Depends(get_db), current_user: schemas.User = Depends(get_current_user)) -> Any:
+    doc = await crud.get_document_by_id(db, job_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": doc.id, "document_id": doc.id, "status": doc.status}
+
+# Retry a failed ingestion job
+@router.post("/jobs/{job_id}/retry", response_model=schemas.IngestJob, status_code=202)
+async def retry_ingest_job(job_id: str, db: AsyncSession = Depends(get_db), current_user: schemas.User = Depends(get_current_user)) -> Any:
+    await require_admin(current_user, db)
+    doc = await crud.get_document_by_id(db, job_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if doc.status != "failed":
+        raise HTTPException(status_code=409, detail=f"Only failed jobs can be retried (status: {doc.status})")
+    path = find_upload(str(doc.id))
+    if not path:
+        raise HTTPException(status_code=410, detail="Uploaded file is no longer available")
+    setattr(doc, "status", "queued")
+    await db.commit()
+    user_id = current_user.get("id") if isinstance(current_user, dict) else getattr(current_user, "id", None)
+    # A failed content replacement is retried incrementally; the old version is still stored
+    await enqueue_ingest(str(doc.id), path, str(user_id) if user_id else None, incremental=bool(doc.ingest_incremental))
+    return {"job_id": doc.id, "document_id": doc.id, "status": doc.status}
+
+
+# Upload a new version of a document's file; only changed chunks are re-embedded
+@router.put("/{doc_id}/content", response_model=schemas.IngestJob, status_code=202)
+async def replace_document_content(
+    doc_id: str,
+    file: UploadFile = File(...),
+    current_user: schemas.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> Any:
+    await require_admin(current_user, db)
+    doc = await crud.get_document_by_id(db, doc_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if doc.status in ("queued", "parsing", "embedding"):
+        raise HTTPException(status_code=409, detail=f"Document is still being ingested (status: {doc.status})")
+    # The current version stays searchable until the job swaps in the new chunks
+    path = await save_upload(file, str(doc.id))
+    setattr(doc, "status", "queued")
+    setattr(doc, "ingest_incremental", True)
+    await db.commit()
+    user_id = current_user.get("id") if isinstance(current_user, dict) else getattr(current_user, "id", None)
+    await enqueue_ingest(str(doc.id), path, str(user_id) if user_id else None, incremental=True)
+    return {"job_id": doc.id, "document_id": doc.id, "status": doc.status}
 
 
-# List all documents
-@router.get("/", response_model=List[schemas.Document])
-async def list_documents(db: AsyncSession = Depends(get_db), current_user: schemas.User = Depends(get_current_user)) -> Any:
-    docs = await crud.list_documents(db)
+# List documents, newest first. Pass the X-Next-Cursor response header back as `cursor`
+# for the next page; format=ndjson streams every matching row instead.
+@router.get("/", response_model=List[schemas.DocumentSummary])
+async def list_documents(
+    response: Response,
+    limit: int = Query(crud.LIST_PAGE_SIZE, ge=1, le=crud.LIST_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    domain_id: Optional[str] = None,
+    status: Optional[str] = None,
+    tag: Optional[List[str]] = Query(None),
+    format: Literal["json", "ndjson"] = "json",
+    db: AsyncSession = Depends(get_read_db),
+    current_user: schemas.User = Depends(get_current_user)
+) -> Any:
+    filters = {"domain_id": domain_id, "status": status, "tags": tag}
+    try:
+        if format == "ndjson":
+            return StreamingResponse(crud.stream_ndjson(crud.documents_query(cursor, **filters)), media_type="application/x-ndjson")
+        docs, next_cursor = await crud.list_documents(db, limit, cursor, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return docs
 
 # Get a document by ID
@@ -60,15 +211,24 @@ async def get_document(doc_id: str, db: AsyncSession = Depends(get_db), current_
 @router.put("/{doc_id}", response_model=schemas.Document)
 async def update_document(doc_id: str, doc_update: schemas.DocumentCreate, db: AsyncSession = Depends(get_db), current_user: schemas.User = Depends(get_current_user)) -> Any:
     await require_admin(current_user, db)
+    existing = await crud.get_document_by_id(db, doc_id)
+    old_domain_id = existing.domain_id if existing else None
     doc = await crud.update_document(db, doc_id, doc_update)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
+    await answer_cache.invalidate(old_domain_id)
+    if doc.domain_id != old_domain_id:
+        await answer_cache.invalidate(doc.domain_id)
     return doc
 
 # Delete a document
 @router.delete("/{doc_id}", status_code=204)
 async def delete_document(doc_id: str, db: AsyncSession = Depends(get_db), current_user: schemas.User = Depends(get_current_user)) -> None:
-    await require_admin(current_user)
+    await require_admin(current_user, db)
+    existing = await crud.get_document_by_id(db, doc_id)
+    domain_id = existing.domain_id if existing else None
     success = await crud.delete_document(db, doc_id)
     if not success:
         raise HTTPException(status_code=404, detail="Document not found")
+    await log_action(current_user["id"], "delete_document", doc_id)
+    await answer_cache.invalidate(domain_id)
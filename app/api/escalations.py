@@ -1,19 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.database import get_db
+from app.db.database import get_db, get_read_db
 from app.utils import crud
+from app.utils.logging import log_action
 from app.db import schemas
 from app.utils.security import get_current_user, require_admin
-from typing import List, Any
+from typing import List, Any, Literal, Optional
 
 router = APIRouter()
 
+# Newest first, keyset-paginated via the X-Next-Cursor header; format=ndjson streams all rows
 @router.get("/", response_model=List[schemas.Escalation])
-async def list_escalations(current_user: schemas.User = Depends(get_current_user), db: AsyncSession = Depends(get_db)) -> Any:
-    require_admin(current_user)
-    return await crud.get_escalations(db)
+async def list_escalations(
+    response: Response,
+    limit: int = Query(crud.LIST_PAGE_SIZE, ge=1, le=crud.LIST_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+    current_user: schemas.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db)
+) -> Any:
+    await require_admin(current_user, db)
+    try:
+        if format == "ndjson":
+            return StreamingResponse(crud.stream_ndjson(crud.escalations_query(cursor, status)), media_type="application/x-ndjson")
+        escalations, next_cursor = await crud.get_escalations(db, limit, cursor, status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return escalations
 
 @router.post("/resolve/{escalation_id}")
 async def resolve_escalation(escalation_id: str, current_user: schemas.User = Depends(get_current_user), db: AsyncSession = Depends(get_db)) -> Any:
-    require_admin(current_user)
-    return await crud.resolve_escalation(db, escalation_id)
+    await require_admin(current_user, db)
+    escalation = await crud.resolve_escalation(db, escalation_id)
+    if escalation:
+        await log_action(current_user["id"], "resolve_escalation", escalation_id)
+    return escalation
@@ -1,39 +1,130 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.database import get_db
+from app.db.database import get_db, SessionLocal
 from app.utils import crud
 from app.db import schemas
-from app.services.rag_pipeline import rag_pipeline
+from app.services.rag_pipeline import (
+    rag_pipeline, prepare_context, generate_answer_stream, finish_answer, estimate_confidence,
+    RagResult, NO_DOCUMENTS_ANSWER
+)
+from app.services.ollama_client import OllamaUnavailableError
+from app.services.write_behind import exchange_writer, insert_rows, Row, ASK_WRITE_BEHIND
+from app.services.metrics import stage_seconds
 from app.utils.security import get_current_user
-from typing import Any
+from app.utils.logging import log_action
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Tuple
+import os
+import json
+import uuid
 
 router = APIRouter()
 
+# ANN recall/latency tradeoff for /ask (unset = server defaults)
+ASK_EF_SEARCH = int(os.getenv("ASK_EF_SEARCH")) if os.getenv("ASK_EF_SEARCH") else None
+ASK_IVFFLAT_PROBES = int(os.getenv("ASK_IVFFLAT_PROBES")) if os.getenv("ASK_IVFFLAT_PROBES") else None
+
 @router.post("/ask", response_model=schemas.Answer)
 async def ask_question(
     question: schemas.QuestionCreate,
     current_user: dict = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ) -> Any:
-    # Store question
+    # RAG pipeline for answer; nothing is written until it finishes
+    try:
+        result = await rag_pipeline(
+            db, question.question_text, str(question.domain_id),
+            ef_search=ASK_EF_SEARCH, probes=ASK_IVFFLAT_PROBES, search_mode=question.search_mode
+        )
+    except OllamaUnavailableError:
+        raise HTTPException(status_code=503, detail="Answer service temporarily unavailable")
+    answer = await _save_exchange(db, current_user["id"], question, result)
+    # Not a column: tells the client the answer came from the semantic answer cache
+    answer["cached"] = result.cached
+    return answer
+
+
+# Question, answer and (for low confidence) escalation rows for a finished answer.
+# Ids and timestamps are generated here so nothing needs to be read back.
+def _exchange_rows(user_id: str, question: schemas.QuestionCreate, result: RagResult) -> Tuple[List[Row], Dict[str, Any]]:
     from app.db.models import Question, Answer, Escalation
-    import uuid
-    db_question = Question(id=uuid.uuid4(), user_id=current_user["id"], question_text=question.question_text, domain_id=question.domain_id)
-    db.add(db_question)
-    await db.commit()
-    await db.refresh(db_question)
-
-    # RAG pipeline for answer
-    answer_text, confidence, source_docs = await rag_pipeline(db, question.question_text, str(question.domain_id))
-    db_answer = Answer(id=uuid.uuid4(), question_id=db_question.id, answer_text=answer_text, source_docs=source_docs, confidence=confidence)
-    db.add(db_answer)
-    await db.commit()
-    await db.refresh(db_answer)
-
-    # Escalate if confidence low
-    if confidence < 0.7:
-        escalation = Escalation(id=uuid.uuid4(), question_id=db_question.id, user_id=current_user["id"], status="Pending")
-        db.add(escalation)
-        await db.commit()
-        await db.refresh(escalation)
-    return db_answer
+    now = datetime.now(timezone.utc)
+    question_row = {"id": uuid.uuid4(), "user_id": user_id, "question_text": question.question_text,
+                    "domain_id": question.domain_id, "created_at": now}
+    answer_row = {"id": uuid.uuid4(), "question_id": question_row["id"], "answer_text": result.answer,
+                  "source_docs": result.source_docs, "confidence": result.confidence, "created_at": now}
+    rows: List[Row] = [(Question, question_row), (Answer, answer_row)]
+    if result.confidence < 0.7:
+        rows.append((Escalation, {"id": uuid.uuid4(), "question_id": question_row["id"], "user_id": user_id,
+                                  "status": "Pending", "created_at": now}))
+    return rows, answer_row
+
+
+# Persist the exchange in one transaction, or hand it to the write-behind flusher
+async def _save_exchange(db: AsyncSession, user_id: str, question: schemas.QuestionCreate, result: RagResult) -> Dict[str, Any]:
+    rows, answer_row = _exchange_rows(user_id, question, result)
+    with stage_seconds("ask", "save"):
+        if ASK_WRITE_BEHIND:
+            await exchange_writer.submit(rows)
+        else:
+            await insert_rows(db, rows)
+            await db.commit()
+    await log_action(user_id, "ask_question", answer_row["question_id"])
+    return dict(answer_row)
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+# Same pipeline as /ask, but answer tokens are streamed as server-sent events while
+# the LLM generates them. Citations follow in a final event once rows are saved.
+@router.post("/ask/stream")
+async def ask_question_stream(
+    question: schemas.QuestionCreate,
+    current_user: dict = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> Any:
+    user_id = current_user["id"]
+    domain_id = str(question.domain_id)
+    # Retrieval and reranking happen before the response starts so failures map to a status code
+    try:
+        context = await prepare_context(
+            db, question.question_text, domain_id,
+            ef_search=ASK_EF_SEARCH, probes=ASK_IVFFLAT_PROBES, search_mode=question.search_mode
+        )
+    except OllamaUnavailableError:
+        raise HTTPException(status_code=503, detail="Answer service temporarily unavailable")
+
+    async def events():
+        if context.cached is not None or not context.chunks:
+            result = context.cached or RagResult(NO_DOCUMENTS_ANSWER, 0.0, [])
+            yield _sse("token", {"text": result.answer})
+        else:
+            parts = []
+            try:
+                async for token in generate_answer_stream(context.chunks, question.question_text):
+                    parts.append(token)
+                    yield _sse("token", {"text": token})
+            except OllamaUnavailableError:
+                yield _sse("error", {"detail": "Answer service temporarily unavailable"})
+                return
+            answer = "".join(parts)
+            result = await finish_answer(domain_id, context, answer, estimate_confidence(answer), context.chunks)
+        # The request-scoped session may already be closed once streaming starts
+        async with SessionLocal() as session:  # type: ignore
+            db_answer = await _save_exchange(session, user_id, question, result)
+        yield _sse("citations", {
+            "answer_id": str(db_answer["id"]),
+            "question_id": str(db_answer["question_id"]),
+            "confidence": result.confidence,
+            "source_docs": result.source_docs,
+            "cached": result.cached,
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,18 +1,80 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
-from typing import AsyncGenerator
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, Optional
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Optional read replica for search and listings; unset = everything goes to the primary
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
 
-engine = create_async_engine(DATABASE_URL, echo=True, future=True)
+# Connection pool and driver settings
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))  # 0 = no timeout
+# Set to 0 behind PgBouncer in transaction pooling mode
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", "100"))
+
+
+def engine_options(url: str) -> Dict[str, Any]:
+    options: Dict[str, Any] = {
+        "echo": DB_ECHO,
+        "future": True,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if url.startswith("postgresql+asyncpg"):
+        server_settings = {"application_name": "knowledgehub"}
+        if DB_STATEMENT_TIMEOUT_MS:
+            server_settings["statement_timeout"] = str(DB_STATEMENT_TIMEOUT_MS)
+        options["connect_args"] = {
+            "server_settings": server_settings,
+            # asyncpg's own cache and SQLAlchemy's adapter-level cache
+            "statement_cache_size": DB_PREPARED_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": DB_PREPARED_STATEMENT_CACHE_SIZE,
+        }
+    return options
+
+
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+read_engine = create_async_engine(DATABASE_READ_URL, **engine_options(DATABASE_READ_URL)) if DATABASE_READ_URL else engine
 SessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False) # type: ignore
+ReadSessionLocal = sessionmaker(bind=read_engine, class_=AsyncSession, expire_on_commit=False) # type: ignore
 Base = declarative_base()
 
 # Dependency for FastAPI
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with SessionLocal() as session: # type: ignore
         yield session
+
+# Dependency for read-only endpoints: replica session (primary when no replica is configured)
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    async with ReadSessionLocal() as session: # type: ignore
+        yield session
+
+
+# Session for read-only queries inside a request: a replica session when one is configured,
+# otherwise the caller's primary session (no extra connection checkout)
+@asynccontextmanager
+async def read_session(db: Optional[AsyncSession] = None) -> AsyncIterator[AsyncSession]:
+    if db is not None and read_engine is engine:
+        yield db
+        return
+    async with ReadSessionLocal() as session: # type: ignore
+        yield session
+
+
+async def dispose_engines() -> None:
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
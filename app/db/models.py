@@ -1,11 +1,14 @@
 import uuid
-from sqlalchemy import Column, String, DateTime, ForeignKey, JSON, Integer, Float, Text
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import Column, String, DateTime, ForeignKey, JSON, Integer, Float, Text, Index, Boolean, false
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from pgvector.sqlalchemy import Vector
 from .database import Base
 
+# Postgres text search configuration for chunk_tsv (must match the migration)
+TEXT_SEARCH_CONFIG = "english"
+
 class Role(Base):
     __tablename__ = "roles"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -41,17 +44,53 @@ class Document(Base):
     tags = Column(JSONB)
     file_type = Column(String)
     status = Column(String)
+    # sha256 of the raw upload, used to detect re-uploads of identical files
+    content_hash = Column(String(64), index=True)
+    # The pending (or failed) ingest job replaces a previous version incrementally, so
+    # retries and restart recovery must not fall back to a full delete-and-reingest
+    ingest_incremental = Column(Boolean, nullable=False, default=False, server_default=false())
     domain = relationship("Domain", back_populates="documents")
     embeddings = relationship("DocumentEmbedding", back_populates="document")
+    # Keyset pagination (newest first), optionally within a domain, and tag filters
+    __table_args__ = (
+        Index("ix_documents_uploaded_at_id", "uploaded_at", "id"),
+        Index("ix_documents_domain_uploaded_at_id", "domain_id", "uploaded_at", "id"),
+        Index("ix_documents_tags", "tags", postgresql_using="gin"),
+    )
 
 class DocumentEmbedding(Base):
     __tablename__ = "document_embeddings"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"))
+    # Copy of Document.domain_id so vector search can filter without a join
+    domain_id = Column(UUID(as_uuid=True), ForeignKey("domains.id"))
     chunk_text = Column(Text, nullable=False)
+    # sha256 of embedding model + chunk text (key into embedding_cache)
+    chunk_hash = Column(String(64))
     vector = Column(Vector(768))
+    # Full-text representation of chunk_text for lexical/hybrid search
+    chunk_tsv = Column(TSVECTOR)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     document = relationship("Document", back_populates="embeddings")
+    # ANN index for l2_distance ordering (see alembic add_vector_ann_index; may be IVFFlat)
+    __table_args__ = (
+        Index(
+            "ix_document_embeddings_vector", "vector",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"vector": "vector_l2_ops"},
+        ),
+        Index("ix_document_embeddings_domain_id", "domain_id", "document_id"),
+        Index("ix_document_embeddings_chunk_tsv", "chunk_tsv", postgresql_using="gin"),
+    )
+
+# Content-addressed vectors: identical chunks under the same model are embedded once
+class EmbeddingCache(Base):
+    __tablename__ = "embedding_cache"
+    chunk_hash = Column(String(64), primary_key=True)
+    model = Column(String, nullable=False)
+    vector = Column(Vector(768), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class Question(Base):
     __tablename__ = "questions"
@@ -77,6 +116,9 @@ class Escalation(Base):
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
     status = Column(String, default="Pending")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    __table_args__ = (
+        Index("ix_escalations_created_at_id", "created_at", "id"),
+    )
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
@@ -1,4 +1,4 @@
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Literal
 from uuid import UUID
 from datetime import datetime
 from pydantic import BaseModel, EmailStr, Field
@@ -66,6 +66,37 @@ class Document(DocumentBase):
     class Config:
         orm_mode = True
 
+# Listing projection: everything but the content body
+class DocumentSummary(BaseModel):
+    id: UUID
+    title: str
+    domain_id: Optional[UUID]
+    uploaded_by: Optional[UUID]
+    uploaded_at: datetime
+    version: Optional[int]
+    tags: Optional[Any]
+    file_type: Optional[str]
+    status: Optional[str]
+    class Config:
+        orm_mode = True
+
+class IngestJob(BaseModel):
+    job_id: UUID
+    document_id: UUID
+    status: Optional[str]
+
+class BulkUploadItem(BaseModel):
+    filename: str
+    document_id: Optional[UUID]
+    status: str
+    error: Optional[str]
+
+class BulkUploadResult(BaseModel):
+    domain_id: UUID
+    accepted: int
+    failed: int
+    items: List[BulkUploadItem]
+
 class DocumentEmbeddingBase(BaseModel):
     document_id: UUID
     chunk_text: str
@@ -83,7 +114,8 @@ class QuestionBase(BaseModel):
     domain_id: UUID
 
 class QuestionCreate(QuestionBase):
-    pass
+    # Retrieval mode: pure vector similarity or hybrid lexical + vector with rank fusion
+    search_mode: Literal["vector", "hybrid"] = "vector"
 
 class Question(QuestionBase):
     id: UUID
@@ -103,6 +135,7 @@ class AnswerCreate(AnswerBase):
 class Answer(AnswerBase):
     id: UUID
     created_at: datetime
+    cached: bool = False
     class Config:
         orm_mode = True
 
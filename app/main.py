@@ -1,8 +1,46 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from loguru import logger
 from app.api import auth, documents, questions, escalations
+from app.services.ollama_client import ollama_client
+from app.services.ingest_jobs import INGEST_QUEUE_MODE, INGEST_RECOVER_ON_START, inprocess_pool, recover_interrupted_jobs
+from app.services.cache import close_redis
+from app.services.rerankers import warm_rerankers
+from app.services.ingest_pipeline import shutdown_extract_pool
+from app.utils.security import shutdown_hash_pool
+from app.db.database import dispose_engines
+from app.services.metrics import render_metrics, CONTENT_TYPE_LATEST
+from app.services.write_behind import ASK_WRITE_BEHIND, AUDIT_LOG_ENABLED, exchange_writer, audit_writer
 
-app = FastAPI(title="Knowledge Hub", description="Scalable Q&A platform with vector search and LLM integration.")
+
+# App-lifetime resources: pooled model-server client and in-process ingest workers
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await ollama_client.start()
+    await warm_rerankers()
+    if INGEST_QUEUE_MODE == "inprocess":
+        inprocess_pool.start()
+        if INGEST_RECOVER_ON_START:
+            try:
+                await recover_interrupted_jobs()
+            except Exception:
+                logger.exception("Could not recover interrupted ingest jobs")
+    if ASK_WRITE_BEHIND:
+        exchange_writer.start()
+    if AUDIT_LOG_ENABLED:
+        audit_writer.start()
+    yield
+    await exchange_writer.stop()
+    await audit_writer.stop()
+    await inprocess_pool.stop()
+    await ollama_client.close()
+    await close_redis()
+    shutdown_extract_pool()
+    shutdown_hash_pool()
+    await dispose_engines()
+
+app = FastAPI(title="Knowledge Hub", description="Scalable Q&A platform with vector search and LLM integration.", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,3 +54,19 @@ app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(documents.router, prefix="/documents", tags=["documents"])
 app.include_router(questions.router, prefix="/questions", tags=["questions"])
 app.include_router(escalations.router, prefix="/escalations", tags=["escalations"])
+
+
+# Liveness plus write-behind queue health (depth, dropped and failed batches)
+@app.get("/health")
+async def health() -> dict:
+    return {
+        "status": "ok",
+        "audit_log": audit_writer.metrics(),
+        "exchange_writer": exchange_writer.metrics(),
+    }
+
+
+# Prometheus scrape endpoint: stage latency histograms, Ollama token/duration metrics, cache counters
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,276 @@
+
+import os
+import re
+import math
+import time
+import operator
+import hashlib
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+
+try:  # numpy comes with pgvector; without it the answer cache scans in pure Python
+    import numpy as np
+except ImportError:
+    np = None
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+_redis = None
+
+
+# Shared Redis connection for cache tiers; None when REDIS_URL is not configured
+def get_redis():
+    global _redis
+    if _redis is None and REDIS_URL:
+        import redis.asyncio as aioredis
+        _redis = aioredis.from_url(REDIS_URL)
+    return _redis
+
+
+async def close_redis() -> None:
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
+
+
+# Bounded in-process LRU with per-entry TTL
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def normalize_query(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class QueryEmbeddingCache:
+    """
+    Two-level cache for question embeddings keyed by embedding model and normalized text.
+    L1 is a per-process LRU, L2 is Redis shared across uvicorn workers. Redis errors
+    are treated as misses so the cache never fails a request.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+        ttl: float = float(os.getenv("QUERY_CACHE_TTL", "3600")),
+        redis_ttl: int = int(os.getenv("QUERY_CACHE_REDIS_TTL", "86400")),
+    ):
+        self.local = TTLCache(maxsize, ttl)
+        self.redis_ttl = redis_ttl
+        self.model: Optional[str] = None
+        self.stats: Dict[str, int] = {"l1_hits": 0, "l2_hits": 0, "misses": 0}
+
+    def _key(self, model: str, query: str) -> str:
+        digest = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+        return f"qemb:{model}:{digest}"
+
+    def _check_model(self, model: str) -> None:
+        # Vectors from another embedding model are useless; drop them when the model changes
+        if self.model != model:
+            if self.model is not None:
+                logger.info(f"Embedding model changed from {self.model} to {model}; clearing query cache")
+            self.local.clear()
+            self.model = model
+
+    async def get(self, model: str, query: str) -> Optional[List[float]]:
+        self._check_model(model)
+        key = self._key(model, query)
+        vector = self.local.get(key)
+        if vector is not None:
+            self.stats["l1_hits"] += 1
+            return vector
+        redis = get_redis()
+        if redis is not None:
+            try:
+                raw = await redis.get(key)
+            except Exception as e:
+                logger.warning(f"Query cache Redis get failed: {e}")
+                raw = None
+            if raw:
+                vector = array("f", raw).tolist()
+                self.local.set(key, vector)
+                self.stats["l2_hits"] += 1
+                return vector
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, model: str, query: str, vector: List[float]) -> None:
+        self._check_model(model)
+        key = self._key(model, query)
+        self.local.set(key, vector)
+        redis = get_redis()
+        if redis is not None:
+            try:
+                await redis.set(key, array("f", vector).tobytes(), ex=self.redis_ttl)
+            except Exception as e:
+                logger.warning(f"Query cache Redis set failed: {e}")
+
+
+query_embedding_cache = QueryEmbeddingCache()
+
+
+def _unit(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else list(vector)
+
+
+class SemanticAnswerCache:
+    """
+    Per-domain cache of answers keyed by question embedding. A question whose embedding
+    has cosine similarity >= threshold with a cached question reuses its answer,
+    confidence and citations. Each domain carries a generation number (in Redis when
+    available, so all workers see it); bumping it on document changes drops the domain's entries.
+    """
+
+    def __init__(
+        self,
+        threshold: float = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+        max_per_domain: int = int(os.getenv("ANSWER_CACHE_SIZE", "256")),
+        ttl: float = float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+        enabled: bool = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true",
+    ):
+        self.threshold = threshold
+        self.max_per_domain = max_per_domain
+        self.ttl = ttl
+        self.enabled = enabled
+        # domain_id -> (generation, [(unit_vector, expires_at, payload)])
+        self._domains: Dict[str, tuple] = {}
+        # domain_id -> (unit vectors as one float32 matrix, expiry times), rebuilt after set()
+        self._matrices: Dict[str, tuple] = {}
+        self._local_generations: Dict[str, int] = {}
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    async def _generation(self, domain_id: str) -> int:
+        redis = get_redis()
+        if redis is not None:
+            try:
+                value = await redis.get(f"answer_cache_gen:{domain_id}")
+                return int(value or 0)
+            except Exception as e:
+                logger.warning(f"Answer cache Redis get failed: {e}")
+        return self._local_generations.get(domain_id, 0)
+
+    async def get(self, domain_id: str, embedding: List[float]) -> Tuple[Optional[Dict[str, Any]], int]:
+        """
+        Return (payload or None, generation). Pass the generation back to set() so an
+        answer computed before an invalidation is never stored under the new generation.
+        """
+        if not self.enabled:
+            return None, 0
+        generation = await self._generation(domain_id)
+        current = self._domains.get(domain_id)
+        if current is None or current[0] != generation:
+            self._domains.pop(domain_id, None)
+            self._matrices.pop(domain_id, None)
+            self.stats["misses"] += 1
+            return None, generation
+        query = _unit(embedding)
+        now = time.monotonic()
+        self._prune(domain_id, current[1], now)
+        best = self._best_match(domain_id, current[1], query, now)
+        if best is None:
+            self.stats["misses"] += 1
+            return None, generation
+        self.stats["hits"] += 1
+        return best, generation
+
+    # Payload of the most similar unexpired entry at or above the threshold. With numpy this
+    # is one matrix-vector product per lookup instead of a Python loop over every entry.
+    def _best_match(self, domain_id: str, entries: List[tuple], query: List[float], now: float) -> Optional[Dict[str, Any]]:
+        if not entries or len(entries[0][0]) != len(query):
+            return None  # empty, or cached under a different embedding model
+        if np is None:
+            best, best_score = None, self.threshold
+            for vector, expires_at, payload in entries:
+                if expires_at < now:
+                    continue
+                score = sum(map(operator.mul, query, vector))
+                if score >= best_score:
+                    best, best_score = payload, score
+            return best
+        if domain_id not in self._matrices:
+            self._matrices[domain_id] = (
+                np.array([vector for vector, _, _ in entries], dtype=np.float32),
+                np.array([expires_at for _, expires_at, _ in entries]),
+            )
+        matrix, expires = self._matrices[domain_id]
+        scores = matrix @ np.asarray(query, dtype=np.float32)
+        scores[expires < now] = -np.inf
+        i = int(scores.argmax())
+        return entries[i][2] if scores[i] >= self.threshold else None
+
+    async def set(self, domain_id: str, embedding: List[float], payload: Dict[str, Any], generation: int) -> None:
+        if not self.enabled:
+            return
+        if generation != await self._generation(domain_id):
+            return  # domain changed while the answer was being generated
+        current = self._domains.get(domain_id)
+        if current is None or current[0] != generation:
+            current = (generation, [])
+            self._domains[domain_id] = current
+        entries = current[1]
+        now = time.monotonic()
+        self._prune(domain_id, entries, now)
+        if entries and len(entries[0][0]) != len(embedding):
+            entries.clear()  # the embedding model changed: old vectors are not comparable
+        entries.append((_unit(embedding), now + self.ttl, payload))
+        if len(entries) > self.max_per_domain:
+            del entries[0]
+        self._matrices.pop(domain_id, None)
+
+    def _prune(self, domain_id: str, entries: List[tuple], now: float) -> None:
+        live = [entry for entry in entries if entry[1] >= now]
+        if len(live) != len(entries):
+            entries[:] = live
+            self._matrices.pop(domain_id, None)
+
+    # Called whenever a domain's documents change
+    async def invalidate(self, domain_id: Optional[Any]) -> None:
+        if domain_id is None:
+            return
+        domain_id = str(domain_id)
+        self._domains.pop(domain_id, None)
+        self._matrices.pop(domain_id, None)
+        self._local_generations[domain_id] = self._local_generations.get(domain_id, 0) + 1
+        self.stats["invalidations"] += 1
+        redis = get_redis()
+        if redis is not None:
+            try:
+                await redis.incr(f"answer_cache_gen:{domain_id}")
+            except Exception as e:
+                logger.warning(f"Answer cache Redis invalidation failed: {e}")
+
+
+answer_cache = SemanticAnswerCache()
@@ -0,0 +1,130 @@
+
+import os
+import math
+import operator
+from typing import Any, Dict, List, Optional, Tuple
+
+# Prompt context budget in (estimated) model tokens, replacing the old 4000-character cap
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))
+# MMR trade-off: 1.0 = pure relevance order, lower values favour chunks unlike those already packed
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+# Chunks at least this similar to an already packed chunk are dropped as near-duplicates
+CONTEXT_DEDUPE_THRESHOLD = float(os.getenv("CONTEXT_DEDUPE_THRESHOLD", "0.95"))
+
+
+class TokenEstimator:
+    """
+    Characters-per-token estimate for the generation model. Starts from
+    CONTEXT_CHARS_PER_TOKEN and is calibrated from Ollama's prompt_eval_count after
+    each generation (exponential moving average), so it converges on the real tokenizer.
+    """
+
+    def __init__(self, chars_per_token: float = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "4.0")), alpha: float = 0.1):
+        self.chars_per_token = chars_per_token
+        self.alpha = alpha
+
+    def count(self, text: str) -> int:
+        return max(1, math.ceil(len(text) / self.chars_per_token))
+
+    def calibrate(self, prompt_chars: int, prompt_tokens: Optional[int]) -> None:
+        if not prompt_tokens or prompt_chars <= 0:
+            return
+        observed = min(8.0, max(1.5, prompt_chars / prompt_tokens))
+        self.chars_per_token += self.alpha * (observed - self.chars_per_token)
+
+
+token_estimator = TokenEstimator()
+
+
+def _unit(vector: Any) -> Optional[List[float]]:
+    if vector is None:
+        return None
+    values = [float(x) for x in vector]
+    norm = math.sqrt(sum(x * x for x in values))
+    return [x / norm for x in values] if norm else None
+
+
+def _words(text: str) -> set:
+    return set(text.lower().split())
+
+
+def _similarity(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+    # Cosine of the stored chunk vectors; word-set Jaccard when a vector is missing
+    if a["_unit"] is not None and b["_unit"] is not None:
+        return sum(map(operator.mul, a["_unit"], b["_unit"]))
+    union = a["_words"] | b["_words"]
+    return len(a["_words"] & b["_words"]) / len(union) if union else 0.0
+
+
+def format_chunk(position: int, chunk: Dict[str, Any]) -> str:
+    return f"Chunk {position} (ID: {chunk['chunk_id']}): {chunk['chunk_text']}"
+
+
+def pack_context(
+    chunks: List[Dict[str, Any]],
+    budget_tokens: int = CONTEXT_TOKEN_BUDGET,
+    mmr_lambda: float = CONTEXT_MMR_LAMBDA,
+    dedupe_threshold: float = CONTEXT_DEDUPE_THRESHOLD,
+    estimator: TokenEstimator = token_estimator,
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Choose which reranked chunks go into the prompt. Greedy MMR over the candidates
+    (relevance = rerank position, redundancy = similarity to chunks already packed)
+    drops near-duplicates, and a chunk that does not fit the remaining token budget is
+    skipped rather than ending packing, so smaller later chunks can still fill it.
+    Returns the packed chunks (without their vectors) and a report with the prompt
+    tokens saved versus sending every candidate.
+    """
+    n = len(chunks)
+    candidates = []
+    seen_ids = set()
+    for rank, chunk in enumerate(chunks):
+        if chunk["chunk_id"] in seen_ids:
+            continue
+        seen_ids.add(chunk["chunk_id"])
+        candidates.append({
+            "chunk": chunk,
+            "relevance": 1.0 - rank / max(n, 1),
+            "tokens": estimator.count(format_chunk(rank + 1, chunk)),
+            "_unit": _unit(chunk.get("vector")),
+            "_words": _words(chunk["chunk_text"]),
+        })
+    candidate_tokens = sum(c["tokens"] for c in candidates)
+
+    packed: List[Dict[str, Any]] = []
+    remaining = budget_tokens
+    duplicates = 0
+    over_budget = 0
+    while candidates:
+        best, best_score, best_sim = None, -math.inf, 0.0
+        for c in candidates:
+            sim = max((_similarity(c, p) for p in packed), default=0.0)
+            score = mmr_lambda * c["relevance"] - (1 - mmr_lambda) * sim
+            if score > best_score:
+                best, best_score, best_sim = c, score, sim
+        candidates.remove(best)
+        if best_sim >= dedupe_threshold:
+            duplicates += 1
+            continue
+        if best["tokens"] > remaining:
+            over_budget += 1
+            continue
+        packed.append(best)
+        remaining -= best["tokens"]
+
+    packed_tokens = sum(p["tokens"] for p in packed)
+    report = {
+        "candidates": n,
+        "packed": len(packed),
+        "duplicates": duplicates,
+        "over_budget": over_budget,
+        "candidate_tokens": candidate_tokens,
+        "packed_tokens": packed_tokens,
+        "saved_tokens": candidate_tokens - packed_tokens,
+    }
+    return [strip_vector(p["chunk"]) for p in packed], report
+
+
+# Chunks leave the pipeline as citations; vectors are internal
+def strip_vector(chunk: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in chunk.items() if k != "vector"}
@@ -0,0 +1,75 @@
+
+import os
+import mimetypes
+from typing import List, Tuple
+from PyPDF2 import PdfReader
+import docx
+
+# Text extraction and chunking for uploaded files. These functions are CPU-bound and run
+# in a process pool (see ingest_pipeline.iter_document_chunks), one range of PDF pages or
+# text segment per call, so this module stays free of DB and web imports.
+
+TEXT_SEGMENT_BYTES = int(os.getenv("TEXT_SEGMENT_BYTES", str(1024 * 1024)))
+# PDF pages per extraction call: PdfReader loads and parses the whole file on open, so it
+# is opened once per range rather than once per page
+PDF_PAGES_PER_CALL = int(os.getenv("PDF_PAGES_PER_CALL", "16"))
+
+
+# Semantic chunking using LangChain's splitter (sentence/paragraph boundaries)
+def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100) -> list[str]:
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=overlap,
+        separators=["\n\n", "\n", ". ", "! ", "? "]  # prioritize semantic boundaries
+    )
+    return splitter.split_text(text)
+
+
+def detect_file_kind(filename: str) -> str:
+    mime_type, _ = mimetypes.guess_type(filename)
+    name = filename.lower()
+    if mime_type == "application/pdf" or name.endswith(".pdf"):
+        return "pdf"
+    if mime_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document" or name.endswith(".docx"):
+        return "docx"
+    # TXT and unknown types are treated as UTF-8 text
+    return "text"
+
+
+def count_pdf_pages(path: str) -> int:
+    return len(PdfReader(path).pages)
+
+
+# Chunks for pages [start, start + count), one list per page
+def extract_pdf_pages_chunks(path: str, start: int, count: int = PDF_PAGES_PER_CALL) -> List[List[str]]:
+    pages = PdfReader(path).pages
+    result = []
+    for page_index in range(start, min(start + count, len(pages))):
+        text = pages[page_index].extract_text()
+        result.append(chunk_text(text) if text else [])
+    return result
+
+
+def extract_docx_chunks(path: str) -> List[str]:
+    # python-docx has no page model; a DOCX is parsed as one unit
+    doc = docx.Document(path)
+    return chunk_text("\n".join(para.text for para in doc.paragraphs))
+
+
+def extract_text_segment_chunks(path: str, offset: int, segment_bytes: int = TEXT_SEGMENT_BYTES) -> Tuple[List[str], int]:
+    """
+    Chunk roughly `segment_bytes` of a text file starting at `offset`, extended to the
+    next line break so words and UTF-8 sequences are not split. Returns the chunks and
+    the offset of the next segment (-1 at end of file).
+    """
+    with open(path, "rb") as fh:
+        fh.seek(offset)
+        data = fh.read(segment_bytes)
+        if not data:
+            return [], -1
+        data += fh.readline()
+        next_offset = fh.tell()
+        at_end = not fh.read(1)
+    text = data.decode("utf-8", errors="replace")
+    return (chunk_text(text) if text.strip() else []), (-1 if at_end else next_offset)
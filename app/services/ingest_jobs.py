@@ -0,0 +1,232 @@
+
+import os
+import json
+import uuid
+import asyncio
+import zipfile
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from fastapi import UploadFile
+from sqlalchemy import delete, select
+from loguru import logger
+from app.db.database import SessionLocal
+from app.db.models import Document, DocumentEmbedding
+from app.services.ingest_pipeline import ingest_document, reingest_document
+from app.services.cache import answer_cache
+
+# Document.status values for the ingestion lifecycle
+STATUS_QUEUED = "queued"
+STATUS_PARSING = "parsing"
+STATUS_EMBEDDING = "embedding"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+# Statuses of a job that has been queued but not finished
+ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_PARSING, STATUS_EMBEDDING)
+
+# "celery" sends jobs to Redis-backed workers (app.worker), "inprocess" runs them on the API's event loop
+INGEST_QUEUE_MODE = os.getenv("INGEST_QUEUE_MODE", "inprocess")
+# The in-process queue is lost on restart: re-enqueue unfinished jobs at startup.
+# Leave off when several API processes share the database, or each would pick them up.
+INGEST_RECOVER_ON_START = os.getenv("INGEST_RECOVER_ON_START", "true").lower() == "true"
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+
+# Bulk upload limits: files per request and bytes per file (also guards against zip bombs)
+BULK_MAX_FILES = int(os.getenv("BULK_MAX_FILES", "1000"))
+BULK_MAX_FILE_BYTES = int(os.getenv("BULK_MAX_FILE_BYTES", str(100 * 1024 * 1024)))
+MANIFEST_NAME = "manifest.json"
+
+
+def _copy_to_upload(src: BinaryIO, document_id: str, filename: str, max_bytes: Optional[int] = None) -> str:
+    target_dir = os.path.join(UPLOAD_DIR, document_id)
+    os.makedirs(target_dir, exist_ok=True)
+    path = os.path.join(target_dir, os.path.basename(filename or "upload"))
+    written = 0
+    with open(path, "wb") as out:
+        while block := src.read(1024 * 1024):
+            written += len(block)
+            if max_bytes is not None and written > max_bytes:
+                out.close()
+                os.remove(path)
+                raise ValueError(f"File exceeds {max_bytes} bytes")
+            out.write(block)
+    for name in os.listdir(target_dir):
+        if os.path.join(target_dir, name) != path:
+            os.remove(os.path.join(target_dir, name))
+    return path
+
+
+# Persist the upload so a worker can pick it up after the request returns.
+# A new upload for the same document replaces the previous file.
+async def save_upload(file: UploadFile, document_id: str) -> str:
+    def copy() -> str:
+        file.file.seek(0)
+        return _copy_to_upload(file.file, document_id, file.filename or "upload")
+    return await asyncio.to_thread(copy)
+
+
+def parse_manifest(raw: Any) -> Dict[str, Dict[str, Any]]:
+    """
+    Parse a bulk upload manifest into {filename: metadata}. Accepts a JSON list of
+    {"filename", "title", "tags", "file_type"} objects or an object keyed by filename.
+    Raises ValueError on malformed input.
+    """
+    try:
+        data = json.loads(raw) if raw else []
+        if isinstance(data, dict):
+            return {name: dict(meta or {}) for name, meta in data.items()}
+        return {item["filename"]: item for item in data}
+    except (TypeError, KeyError, AttributeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid manifest: {e}") from e
+
+
+# Open a zip archive; returns the archive, its manifest (if any) and the file entries
+def open_bulk_archive(fileobj: BinaryIO) -> Tuple[zipfile.ZipFile, Dict[str, Dict[str, Any]], List[zipfile.ZipInfo]]:
+    fileobj.seek(0)
+    archive = zipfile.ZipFile(fileobj)
+    manifest: Dict[str, Dict[str, Any]] = {}
+    members = []
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        if os.path.basename(info.filename) == MANIFEST_NAME:
+            manifest = parse_manifest(archive.read(info))
+        else:
+            members.append(info)
+    return archive, manifest, members
+
+
+def save_bulk_files(entries: List[Tuple[str, str, Any]], archive: Optional[zipfile.ZipFile] = None) -> List[Any]:
+    """
+    Save (document_id, filename, source) entries, where source is an UploadFile or a
+    member of `archive`. Runs in a worker thread; returns the saved path or the
+    exception for each entry so one bad file does not fail the batch.
+    """
+    results: List[Any] = []
+    for document_id, filename, source in entries:
+        try:
+            if isinstance(source, zipfile.ZipInfo):
+                with archive.open(source) as src:  # type: ignore
+                    results.append(_copy_to_upload(src, document_id, filename, BULK_MAX_FILE_BYTES))
+            else:
+                source.file.seek(0)
+                results.append(_copy_to_upload(source.file, document_id, filename, BULK_MAX_FILE_BYTES))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def find_upload(document_id: str) -> Optional[str]:
+    target_dir = os.path.join(UPLOAD_DIR, document_id)
+    if not os.path.isdir(target_dir):
+        return None
+    files = sorted(os.listdir(target_dir))
+    return os.path.join(target_dir, files[0]) if files else None
+
+
+async def set_status(document_id: str, status: str) -> None:
+    async with SessionLocal() as db:  # type: ignore
+        doc = await db.get(Document, uuid.UUID(document_id))
+        if doc:
+            setattr(doc, "status", status)
+            await db.commit()
+
+
+# Run one ingestion job: parse, chunk, embed and store, tracking Document.status.
+# Incremental jobs re-ingest a new version of an existing document, keeping unchanged chunks.
+async def run_ingest_job(document_id: str, path: str, user_id: Optional[str] = None, incremental: bool = False) -> None:
+    async with SessionLocal() as db:  # type: ignore
+        doc = await db.get(Document, uuid.UUID(document_id))
+        if not doc:
+            logger.warning(f"Ingest job {document_id}: document no longer exists")
+            return
+        try:
+            setattr(doc, "status", STATUS_PARSING)
+            if incremental:
+                await db.commit()
+                await reingest_document(db, doc, path, user_id)
+            else:
+                # Retries start from a clean slate. Embedding batches commit as they go, so
+                # chunks are searchable while the document is still `embedding`.
+                await db.execute(delete(DocumentEmbedding).where(DocumentEmbedding.document_id == doc.id))
+                await db.commit()
+                await ingest_document(db, doc, None, user_id, path=path)
+            setattr(doc, "status", STATUS_READY)
+            await db.commit()
+            # New content is searchable now: cached answers for this domain are stale
+            await answer_cache.invalidate(doc.domain_id)
+        except Exception:
+            logger.exception(f"Ingest job {document_id} failed")
+            await db.rollback()
+            if not incremental:
+                # Batches committed before the failure would keep feeding answers until a retry
+                await db.execute(delete(DocumentEmbedding).where(DocumentEmbedding.document_id == doc.id))
+                await db.commit()
+            await set_status(document_id, STATUS_FAILED)
+            raise
+
+
+# Jobs left queued/parsing/embedding by a restart or crash: re-run those whose upload still
+# exists (incrementally for content replacements) and mark the rest failed.
+async def recover_interrupted_jobs() -> int:
+    async with SessionLocal() as db:  # type: ignore
+        result = await db.execute(select(Document).where(Document.status.in_(ACTIVE_STATUSES)))
+        jobs = []
+        for doc in result.scalars().all():
+            path = find_upload(str(doc.id))
+            setattr(doc, "status", STATUS_QUEUED if path else STATUS_FAILED)
+            if path:
+                jobs.append((str(doc.id), path, bool(doc.ingest_incremental)))
+            else:
+                logger.warning(f"Ingest job {doc.id}: upload missing after restart, marked failed")
+        await db.commit()
+    for document_id, path, incremental in jobs:
+        await enqueue_ingest(document_id, path, None, incremental)
+    if jobs:
+        logger.info(f"Re-enqueued {len(jobs)} interrupted ingest jobs")
+    return len(jobs)
+
+
+# Minimal worker pool on the current event loop, used when Redis/Celery is not available
+class InProcessWorkerPool:
+    def __init__(self, handler: Callable[..., Awaitable[None]], workers: int = INGEST_WORKERS):
+        self.handler = handler
+        self.workers = workers
+        self.queue: "asyncio.Queue[Tuple]" = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, *args) -> None:
+        self.start()
+        await self.queue.put(args)
+
+    async def _worker(self) -> None:
+        while True:
+            args = await self.queue.get()
+            try:
+                await self.handler(*args)
+            except Exception:
+                pass  # handler records the failure on the document
+            finally:
+                self.queue.task_done()
+
+
+inprocess_pool = InProcessWorkerPool(run_ingest_job)
+
+
+async def enqueue_ingest(document_id: str, path: str, user_id: Optional[str] = None, incremental: bool = False) -> None:
+    if INGEST_QUEUE_MODE == "celery":
+        from app.worker import ingest_document_task
+        # Broker publish is blocking network I/O
+        await asyncio.to_thread(ingest_document_task.delay, document_id, path, user_id, incremental)
+    else:
+        await inprocess_pool.enqueue(document_id, path, user_id, incremental)
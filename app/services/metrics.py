@@ -0,0 +1,107 @@
+
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+from prometheus_client import Counter, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Prometheus metrics for the RAG and ingest pipelines, served on /metrics.
+# Hot-path cost is one histogram observation per stage; cache and queue counters are
+# read from the existing stats dicts at scrape time instead of being counted twice.
+
+STAGE_SECONDS = Histogram(
+    "knowledgehub_stage_seconds", "Latency of pipeline stages",
+    ["pipeline", "stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+OLLAMA_TOKENS = Counter(
+    "knowledgehub_ollama_tokens_total", "Tokens processed by Ollama (prompt = prompt_eval_count, eval = eval_count)",
+    ["endpoint", "model", "kind"],
+)
+OLLAMA_SECONDS = Histogram(
+    "knowledgehub_ollama_seconds", "Ollama-reported durations (load, prompt_eval, eval, total)",
+    ["endpoint", "model", "phase"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+PROMPT_CONTEXT_TOKENS = Counter(
+    "knowledgehub_prompt_context_tokens_total", "Estimated context tokens packed into prompts or saved by packing",
+    ["kind"],
+)
+INGEST_CHUNKS = Counter("knowledgehub_ingest_chunks_total", "Chunks stored by ingestion")
+INGEST_CACHE_HITS = Counter("knowledgehub_ingest_embedding_cache_hits_total", "Chunks served from embedding_cache")
+
+_OLLAMA_PHASES = {
+    "load": "load_duration",
+    "prompt_eval": "prompt_eval_duration",
+    "eval": "eval_duration",
+    "total": "total_duration",
+}
+
+
+def observe_stage(pipeline: str, stage: str, seconds: float) -> None:
+    STAGE_SECONDS.labels(pipeline, stage).observe(seconds)
+
+
+@contextmanager
+def stage_seconds(pipeline: str, stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(pipeline, stage, time.perf_counter() - started)
+
+
+# Token counts and durations (nanoseconds) from an Ollama response body or final stream chunk
+def record_ollama_usage(endpoint: str, model: Optional[str], data: Dict[str, Any]) -> None:
+    model = model or ""
+    if data.get("prompt_eval_count"):
+        OLLAMA_TOKENS.labels(endpoint, model, "prompt").inc(data["prompt_eval_count"])
+    if data.get("eval_count"):
+        OLLAMA_TOKENS.labels(endpoint, model, "eval").inc(data["eval_count"])
+    for phase, key in _OLLAMA_PHASES.items():
+        if data.get(key):
+            OLLAMA_SECONDS.labels(endpoint, model, phase).observe(data[key] / 1e9)
+
+
+def observe_packing(report: Dict[str, int]) -> None:
+    PROMPT_CONTEXT_TOKENS.labels("packed").inc(report.get("packed_tokens", 0))
+    PROMPT_CONTEXT_TOKENS.labels("saved").inc(report.get("saved_tokens", 0))
+
+
+def observe_ingest(report: Dict[str, Any]) -> None:
+    for stage in ("embed", "insert", "total"):
+        if report.get(f"{stage}_seconds") is not None:
+            observe_stage("ingest", stage, report[f"{stage}_seconds"])
+    INGEST_CHUNKS.inc(report.get("chunks", 0))
+    INGEST_CACHE_HITS.inc(report.get("cache_hits", 0))
+
+
+class StatsCollector:
+    """Exports cache hit/miss counters and write-behind queue health at scrape time."""
+
+    def collect(self):
+        from app.services.cache import query_embedding_cache, answer_cache
+        from app.services.write_behind import audit_writer, exchange_writer
+        cache = CounterMetricFamily("knowledgehub_cache_events", "Cache lookups by cache and outcome", labels=["cache", "outcome"])
+        for outcome, value in query_embedding_cache.stats.items():
+            cache.add_metric(["query_embedding", outcome], value)
+        for outcome, value in answer_cache.stats.items():
+            cache.add_metric(["answer", outcome], value)
+        yield cache
+        depth = GaugeMetricFamily("knowledgehub_write_behind_queue_depth", "Queued write-behind submissions", labels=["writer"])
+        events = CounterMetricFamily("knowledgehub_write_behind_events", "Write-behind submissions by outcome", labels=["writer", "outcome"])
+        for writer in (audit_writer, exchange_writer):
+            metrics = writer.metrics()
+            depth.add_metric([writer.name], metrics.pop("queue_depth"))
+            for outcome, value in metrics.items():
+                events.add_metric([writer.name, outcome], value)
+        yield depth
+        yield events
+
+
+REGISTRY.register(StatsCollector())
+
+
+def render_metrics() -> bytes:
+    return generate_latest(REGISTRY)
+
@@ -0,0 +1,162 @@
+
+import os
+import time
+import random
+import asyncio
+from typing import Any, AsyncIterator, Optional
+import httpx
+from loguru import logger
+
+
+class OllamaUnavailableError(RuntimeError):
+    """Raised when the model server is unreachable or the circuit breaker is open."""
+
+
+# Circuit breaker: opens after N consecutive failures, lets one probe through after reset_timeout.
+# Other callers keep failing fast until the probe succeeds (closed) or fails (open again).
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # Start of the in-flight half-open probe; a probe that never reports back
+        # (e.g. a cancelled request) is replaced after another reset_timeout
+        self._probe_started: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state != "half-open":
+            return state == "closed"
+        now = time.monotonic()
+        if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+            return False
+        self._probe_started = now
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_started = None
+        # A failed half-open probe re-opens the breaker immediately
+        if self.state == "half-open" or self.failures >= self.failure_threshold:
+            logger.warning(f"Ollama circuit breaker opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+
+
+class OllamaClient:
+    """
+    App-lifetime HTTP client for the Ollama model server.
+    Keeps a keep-alive connection pool, retries transient failures with jittered
+    exponential backoff and fails fast through a circuit breaker when Ollama is down.
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5")),
+        read_timeout: float = float(os.getenv("OLLAMA_READ_TIMEOUT", "60")),
+        max_connections: int = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "20")),
+        max_retries: int = int(os.getenv("OLLAMA_MAX_RETRIES", "2")),
+        backoff_base: float = float(os.getenv("OLLAMA_BACKOFF_BASE", "0.25")),
+        breaker_threshold: int = int(os.getenv("OLLAMA_BREAKER_THRESHOLD", "5")),
+        breaker_reset: float = float(os.getenv("OLLAMA_BREAKER_RESET", "30")),
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _new_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(timeout=self.timeout, limits=self.limits, transport=self._transport)
+
+    async def start(self) -> None:
+        if self._client is None:
+            self._client = self._new_client()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Lazily start when used outside the FastAPI lifespan (scripts, workers)
+        if self._client is None:
+            self._client = self._new_client()
+        return self._client
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, base * 2^attempt]
+        return random.uniform(0, self.backoff_base * (2 ** attempt))
+
+    async def post(
+        self, url: str, json: Any, timeout: Optional[httpx.Timeout] = None, retry_read_timeout: bool = True
+    ) -> httpx.Response:
+        """
+        POST with retries on connection errors and 5xx. Pass retry_read_timeout=False for
+        generation: a server that took the whole read timeout will most likely do so again,
+        and each retry would hold the caller for another full timeout. Every failed attempt
+        counts toward the circuit breaker.
+        """
+        if not self.breaker.allow():
+            raise OllamaUnavailableError("Ollama circuit breaker is open")
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.client.post(url, json=json, timeout=timeout or self.timeout)
+                if response.status_code < 500:
+                    self.breaker.record_success()
+                    return response
+                last_error = httpx.HTTPStatusError(
+                    f"Ollama returned {response.status_code}", request=response.request, response=response
+                )
+            except httpx.TransportError as e:
+                last_error = e
+            self.breaker.record_failure()
+            if isinstance(last_error, httpx.ReadTimeout) and not retry_read_timeout:
+                break
+            if attempt < self.max_retries and self.breaker.state != "open":
+                await asyncio.sleep(self._backoff(attempt))
+            else:
+                break
+        raise OllamaUnavailableError(f"Ollama request to {url} failed: {last_error}") from last_error
+
+    async def stream_lines(self, url: str, json: Any) -> AsyncIterator[str]:
+        """
+        POST and yield the response body line by line (Ollama streams NDJSON).
+        Not retried: a partially consumed stream cannot be replayed.
+        """
+        if not self.breaker.allow():
+            raise OllamaUnavailableError("Ollama circuit breaker is open")
+        try:
+            async with self.client.stream("POST", url, json=json) as response:
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                    raise OllamaUnavailableError(f"Ollama returned {response.status_code}")
+                self.breaker.record_success()
+                async for line in response.aiter_lines():
+                    if line:
+                        yield line
+        except httpx.TransportError as e:
+            self.breaker.record_failure()
+            raise OllamaUnavailableError(f"Ollama stream from {url} failed: {e}") from e
+
+
+# Shared instance, started and closed by the FastAPI lifespan in app.main
+ollama_client = OllamaClient()
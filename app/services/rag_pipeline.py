@@ -1,144 +1,373 @@
 
 import os
-from typing import List, Tuple, Any
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import json
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Any, Optional, NamedTuple, AsyncIterator
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.db.models import DocumentEmbedding
-import httpx
+from sqlalchemy import select, func, cast
+from pgvector.sqlalchemy import Vector, HALFVEC, BIT
+from app.db.database import ReadSessionLocal, read_session
+from app.db.models import DocumentEmbedding, TEXT_SEARCH_CONFIG
+from app.services.ollama_client import ollama_client
+from app.services.cache import query_embedding_cache, answer_cache
+from app.services.rerankers import get_reranker
+from app.services.metrics import observe_stage, observe_packing, record_ollama_usage
+from app.services.context_packing import pack_context, token_estimator, format_chunk
+from app.services.ingest_pipeline import get_embeddings_batch, normalize_embedding
 
-# Get embedding for query using Ollama API
+logger = logging.getLogger("rag_pipeline")
+
+
+# Record wall-clock milliseconds for one pipeline stage into `timings` and the
+# knowledgehub_stage_seconds histogram
+@contextmanager
+def stage_timer(timings: Dict[str, float], stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timings[stage] = round(elapsed * 1000, 2)
+        observe_stage("rag", stage, elapsed)
+
+# Get embedding for query using Ollama API: same endpoint and normalization as document
+# chunks (ingest_pipeline.get_embeddings_batch), so both sides share one vector scale
 async def get_query_embedding(query: str) -> List[float]:
     ollama_base_url = os.getenv("OLLAMA_BASE_URL")
     ollama_embedding_model = os.getenv("OLLAMA_EMBEDDING_MODEL")
     if not ollama_base_url or not ollama_embedding_model:
         raise RuntimeError("OLLAMA_BASE_URL and OLLAMA_EMBEDDING_MODEL must be set in .env")
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        response = await client.post(
-            f"{ollama_base_url}/api/embeddings",
-            json={"model": ollama_embedding_model, "prompt": query}
+    cached = await query_embedding_cache.get(ollama_embedding_model, query)
+    if cached is not None:
+        # Entries cached before normalization was introduced may still be raw
+        return normalize_embedding(cached)
+    embedding = (await get_embeddings_batch([query]))[0]
+    if any(embedding):
+        await query_embedding_cache.set(ollama_embedding_model, query, embedding)
+    return embedding
+
+
+
+# pgvector >= 0.8: keep scanning the ANN index until enough rows pass the domain filter
+VECTOR_ITERATIVE_SCAN = os.getenv("VECTOR_ITERATIVE_SCAN")  # e.g. "relaxed_order"
+
+# Candidate search precision: "full" (vector index), "halfvec" or "binary" (compact
+# expression indexes from the add_compact_vector_indexes migration). Compact modes
+# fetch top_k * VECTOR_RERANK_OVERSAMPLE candidates and re-rank them at full precision.
+VECTOR_SEARCH_PRECISION = os.getenv("VECTOR_SEARCH_PRECISION", "full")
+VECTOR_RERANK_OVERSAMPLE = int(os.getenv("VECTOR_RERANK_OVERSAMPLE", "4"))
+VECTOR_DIM = DocumentEmbedding.vector.type.dim
+
+
+# Distance on the compact representation; the expressions must match the index definitions
+def coarse_distance(precision: str, query_embedding: List[float]):
+    if precision == "halfvec":
+        return cast(DocumentEmbedding.vector, HALFVEC(VECTOR_DIM)).op("<->")(cast(query_embedding, HALFVEC(VECTOR_DIM)))
+    if precision == "binary":
+        return cast(func.binary_quantize(DocumentEmbedding.vector), BIT(VECTOR_DIM)).op("<~>")(
+            func.binary_quantize(cast(query_embedding, Vector(VECTOR_DIM)))
         )
-        if response.status_code == 200:
-            data = response.json()
-            return data.get("embedding", [0.0] * 384)
-    return [0.0] * 384
+    raise ValueError(f"Unsupported vector search precision '{precision}' (expected full, halfvec or binary)")
 
 
+# Per-query ANN tuning: higher ef_search (HNSW) / probes (IVFFlat) trade latency for recall.
+# set_config(..., true) scopes the setting to the current transaction.
+async def apply_search_params(db: AsyncSession, ef_search: Optional[int] = None, probes: Optional[int] = None) -> None:
+    if VECTOR_ITERATIVE_SCAN:
+        await db.execute(select(func.set_config("hnsw.iterative_scan", VECTOR_ITERATIVE_SCAN, True)))
+    if ef_search is not None:
+        await db.execute(select(func.set_config("hnsw.ef_search", str(int(ef_search)), True)))
+    if probes is not None:
+        await db.execute(select(func.set_config("ivfflat.probes", str(int(probes)), True)))
+
 
 # Vector search with domain filtering and chunk metadata
-async def vector_search(db: AsyncSession, query: str, domain_id: str, top_k: int = 10) -> List[dict]:
-    query_embedding = await get_query_embedding(query)
-    # Filter by domain before vector search
-    from app.db.models import DocumentEmbedding, Document
+async def vector_search(
+    db: AsyncSession,
+    query: str,
+    domain_id: str,
+    top_k: int = 10,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    query_embedding: Optional[List[float]] = None,
+    precision: Optional[str] = None
+) -> List[dict]:
+    if query_embedding is None:
+        query_embedding = await get_query_embedding(query)
+    precision = precision or VECTOR_SEARCH_PRECISION
+    candidate_k = top_k * VECTOR_RERANK_OVERSAMPLE
+    if precision != "full":
+        # HNSW returns at most ef_search rows, so widen it to the candidate count
+        ef_search = max(ef_search or 0, candidate_k)
+    await apply_search_params(db, ef_search, probes)
+    # Filter by domain before vector search (domain_id is denormalized onto embeddings)
+    distance = DocumentEmbedding.vector.l2_distance(query_embedding)
     stmt = (
-        select(DocumentEmbedding)
-        .join(Document, DocumentEmbedding.document_id == Document.id)
+        select(DocumentEmbedding, distance.label("distance"))
         .where(DocumentEmbedding.vector != None)
-        .where(Document.domain_id == domain_id)
-        .order_by(DocumentEmbedding.vector.l2_distance(query_embedding))
+        .where(DocumentEmbedding.domain_id == domain_id)
+    )
+    if precision != "full":
+        # Coarse pass on the compact index, then an exact l2 re-rank of the candidates.
+        # MATERIALIZED keeps the planner from answering the outer ORDER BY with the
+        # full-precision index instead.
+        candidates = (
+            select(DocumentEmbedding.id)
+            .where(DocumentEmbedding.domain_id == domain_id)
+            .order_by(coarse_distance(precision, query_embedding))
+            .limit(candidate_k)
+            .cte("candidates")
+            .prefix_with("MATERIALIZED")
+        )
+        stmt = stmt.join(candidates, candidates.c.id == DocumentEmbedding.id)
+    result = await db.execute(stmt.order_by(distance).limit(top_k))
+    # Return chunk text and metadata for citation; distance feeds the CPU rerankers and
+    # the stored vector lets context packing drop near-duplicate chunks
+    return [
+        {"chunk_text": e.chunk_text, "document_id": str(e.document_id), "chunk_id": str(e.id), "distance": float(d), "vector": e.vector}
+        for e, d in result.all()
+    ]
+
+
+
+
+# Full-text search over chunk_tsv: catches exact part numbers, error codes and acronyms
+async def lexical_search(
+    db: AsyncSession,
+    query: str,
+    domain_id: str,
+    top_k: int = 10,
+    query_embedding: Optional[List[float]] = None
+) -> List[dict]:
+    if query_embedding is None:
+        query_embedding = await get_query_embedding(query)
+    ts_query = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, query)
+    rank = func.ts_rank_cd(DocumentEmbedding.chunk_tsv, ts_query)
+    # Also return the vector distance so rerankers can score lexical-only hits
+    distance = DocumentEmbedding.vector.l2_distance(query_embedding)
+    stmt = (
+        select(DocumentEmbedding, distance.label("distance"))
+        .where(DocumentEmbedding.domain_id == domain_id)
+        .where(DocumentEmbedding.chunk_tsv.op("@@")(ts_query))
+        .order_by(rank.desc())
         .limit(top_k)
     )
     result = await db.execute(stmt)
-    embeddings = result.scalars().all()
-    # Return chunk text and metadata for citation
-    return [{"chunk_text": e.chunk_text, "document_id": str(e.document_id), "chunk_id": str(e.id)} for e in embeddings if hasattr(e, "chunk_text")]
-
-
-# LLM-based reranking of chunks
-async def rerank_chunks_with_llm(chunks: List[dict], question: str, ollama_base_url: str, ollama_model: str, top_k: int = 5) -> List[dict]:
-    if not chunks:
-        return []
-    # Build rerank prompt with chunk IDs
-    context = "\n".join([f"{i+1}. {chunk['chunk_text']} (Chunk ID: {chunk['chunk_id']})" for i, chunk in enumerate(chunks)])
-    prompt = (
-        f"Given the following context chunks and the question, rank the chunks by relevance to the question.\n"
-        f"Chunks:\n{context}\n\nQuestion: {question}\n"
-        "Return the most relevant chunk numbers as a comma-separated list."
-    )
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        response = await client.post(
-            f"{ollama_base_url}/api/generate",
-            json={"model": ollama_model, "prompt": prompt, "stream": False}
-        )
-        if response.status_code == 200:
-            data = response.json()
-            answer = data.get("response", "")
-            # Parse chunk numbers from LLM response
-            import re
-            match = re.findall(r'\d+', answer)
-            indices = [int(i)-1 for i in match if 0 < int(i) <= len(chunks)]
-            reranked = [chunks[i] for i in indices][:top_k]
-            if reranked:
-                return reranked
-    # Fallback: return original top_k
-    return chunks[:top_k]
+    return [
+        {"chunk_text": e.chunk_text, "document_id": str(e.document_id), "chunk_id": str(e.id), "distance": float(d), "vector": e.vector}
+        for e, d in result.all()
+    ]
 
 
+# Reciprocal rank fusion: score(chunk) = sum over result lists of 1 / (k + rank)
+def reciprocal_rank_fusion(result_lists: List[List[dict]], top_k: int = 10, k: int = 60) -> List[dict]:
+    scores: Dict[str, float] = {}
+    chunks: Dict[str, dict] = {}
+    for results in result_lists:
+        for rank, chunk in enumerate(results, start=1):
+            chunk_id = chunk["chunk_id"]
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+            chunks.setdefault(chunk_id, chunk)
+    ranked = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [dict(chunks[chunk_id], rrf_score=round(scores[chunk_id], 6)) for chunk_id in ranked]
 
 
+# Hybrid retrieval: vector and lexical queries run concurrently (separate sessions), merged with RRF
+async def hybrid_search(
+    db: AsyncSession,
+    query: str,
+    domain_id: str,
+    top_k: int = 10,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    query_embedding: Optional[List[float]] = None
+) -> List[dict]:
+    if query_embedding is None:
+        query_embedding = await get_query_embedding(query)
 
-# LLM answer generation using Ollama API with hallucination guard and citations
-async def generate_answer(chunks: List[dict], question: str, max_context_chars: int = 4000) -> Tuple[str, float, List[dict]]:
-    ollama_base_url = os.getenv("OLLAMA_BASE_URL")
-    ollama_model = os.getenv("OLLAMA_MODEL")
-    if not ollama_base_url or not ollama_model:
-        raise RuntimeError("OLLAMA_BASE_URL and OLLAMA_MODEL must be set in .env")
+    async def lexical() -> List[dict]:
+        async with ReadSessionLocal() as session:  # type: ignore
+            return await lexical_search(session, query, domain_id, top_k, query_embedding)
+
+    vector_hits, lexical_hits = await asyncio.gather(
+        vector_search(db, query, domain_id, top_k, ef_search, probes, query_embedding),
+        lexical()
+    )
+    return reciprocal_rank_fusion([vector_hits, lexical_hits], top_k=top_k)
+
+
+SEARCH_MODES = {"vector": vector_search, "hybrid": hybrid_search}
+
+
+# Build the grounded prompt from packed chunks (see context_packing.pack_context);
+# max_context_chars is a final safety cap
+def build_answer_prompt(chunks: List[dict], question: str, max_context_chars: int = 8000) -> str:
     context_chunks = []
     total_chars = 0
     used_chunk_ids = set()
     for i, chunk in enumerate(chunks):
-        chunk_text = chunk["chunk_text"]
         chunk_id = chunk["chunk_id"]
         # Avoid duplicate chunks
         if chunk_id in used_chunk_ids:
             continue
-        entry = f"Chunk {i+1} (ID: {chunk_id}): {chunk_text}"
+        entry = format_chunk(i + 1, chunk)
         if total_chars + len(entry) > max_context_chars:
-            break
+            continue  # a shorter later chunk may still fit
         context_chunks.append(entry)
         total_chars += len(entry)
         used_chunk_ids.add(chunk_id)
     context = "\n\n".join(context_chunks)
 
-    prompt = (
+    return (
         f"Context (with chunk IDs for citation):\n{context}\n\nQuestion: {question}\n\n"
         "Instructions: Only answer using the context above. If the answer is present, cite the chunk ID. If not, reply 'I don't know.' Do not make up information."
         "\nAnswer:"
     )
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        response = await client.post(
-            f"{ollama_base_url}/api/generate",
-            json={"model": ollama_model, "prompt": prompt, "stream": False}
-        )
-        if response.status_code == 200:
-            data = response.json()
-            answer = data.get("response", "")
-            # Log raw LLM response for debugging
-            import logging
-            logging.getLogger("rag_pipeline").info(f"LLM raw response: {answer}")
-            # Confidence estimation: simple heuristic (can be improved)
-            confidence = 0.9 if answer and "I don't know" not in answer else 0.0
-            return answer, confidence, chunks
+
+
+# Confidence estimation: simple heuristic (can be improved)
+def estimate_confidence(answer: str) -> float:
+    return 0.9 if answer and "I don't know" not in answer else 0.0
+
+
+def _generation_settings() -> Tuple[str, str]:
+    ollama_base_url = os.getenv("OLLAMA_BASE_URL")
+    ollama_model = os.getenv("OLLAMA_MODEL")
+    if not ollama_base_url or not ollama_model:
+        raise RuntimeError("OLLAMA_BASE_URL and OLLAMA_MODEL must be set in .env")
+    return ollama_base_url, ollama_model
+
+
+# LLM answer generation using Ollama API with hallucination guard and citations
+async def generate_answer(chunks: List[dict], question: str, max_context_chars: int = 8000) -> Tuple[str, float, List[dict]]:
+    ollama_base_url, ollama_model = _generation_settings()
+    prompt = build_answer_prompt(chunks, question, max_context_chars)
+    response = await ollama_client.post(
+        f"{ollama_base_url}/api/generate",
+        json={"model": ollama_model, "prompt": prompt, "stream": False},
+        retry_read_timeout=False
+    )
+    if response.status_code == 200:
+        data = response.json()
+        record_ollama_usage("generate", ollama_model, data)
+        token_estimator.calibrate(len(prompt), data.get("prompt_eval_count"))
+        answer = data.get("response", "")
+        # Log raw LLM response for debugging
+        logger.info(f"LLM raw response: {answer}")
+        return answer, estimate_confidence(answer), chunks
     return "", 0.0, chunks
 
 
+# Streaming variant of generate_answer: yields response tokens as Ollama produces them
+async def generate_answer_stream(chunks: List[dict], question: str, max_context_chars: int = 8000) -> AsyncIterator[str]:
+    ollama_base_url, ollama_model = _generation_settings()
+    prompt = build_answer_prompt(chunks, question, max_context_chars)
+    async for line in ollama_client.stream_lines(
+        f"{ollama_base_url}/api/generate",
+        json={"model": ollama_model, "prompt": prompt, "stream": True}
+    ):
+        data = json.loads(line)
+        token = data.get("response", "")
+        if token:
+            yield token
+        if data.get("done"):
+            # Token counts and durations arrive on the final chunk
+            record_ollama_usage("generate", ollama_model, data)
+            token_estimator.calibrate(len(prompt), data.get("prompt_eval_count"))
+            break
 
-async def rag_pipeline(
+
+class RagResult(NamedTuple):
+    answer: str
+    confidence: float
+    source_docs: List[dict]
+    cached: bool = False
+
+
+# Everything before generation: cache lookup, retrieval and reranking
+class RagContext(NamedTuple):
+    query_embedding: List[float]
+    chunks: List[dict]
+    cache_generation: int
+    cached: Optional[RagResult] = None
+    timings: Optional[Dict[str, float]] = None
+    packing: Optional[Dict[str, int]] = None
+
+
+NO_DOCUMENTS_ANSWER = "No relevant documents found."
+
+
+async def prepare_context(
     db: AsyncSession,
     question: str,
     domain_id: str,
-    top_k: int = 5
-) -> Tuple[str, float, List[dict]]:
+    top_k: int = 5,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    search_mode: str = "vector"
+) -> RagContext:
+    timings: Dict[str, float] = {}
+    # Step 0: Serve near-identical questions from the per-domain answer cache
+    with stage_timer(timings, "embed"):
+        query_embedding = await get_query_embedding(question)
+    with stage_timer(timings, "answer_cache"):
+        cached, cache_generation = await answer_cache.get(domain_id, query_embedding)
+    if cached is not None:
+        result = RagResult(cached["answer"], cached["confidence"], cached["source_docs"], cached=True)
+        return RagContext(query_embedding, [], cache_generation, cached=result, timings=timings)
     # Step 1: Retrieve relevant chunks with domain filtering and metadata
-    initial_chunks = await vector_search(db, question, domain_id, top_k=10)
+    search = SEARCH_MODES[search_mode]
+    with stage_timer(timings, f"search_{search_mode}"):
+        # Retrieval is read-only: routed to the read replica when one is configured
+        async with read_session(db) as read_db:
+            initial_chunks = await search(
+                read_db, question, domain_id, top_k=10, ef_search=ef_search, probes=probes, query_embedding=query_embedding
+            )
     if not initial_chunks:
-        return "No relevant documents found.", 0.0, []
-    # Step 2: Rerank with LLM
-    ollama_base_url = os.getenv("OLLAMA_BASE_URL")
-    ollama_model = os.getenv("OLLAMA_MODEL")
-    if not ollama_base_url or not ollama_model:
-        raise RuntimeError("OLLAMA_BASE_URL and OLLAMA_MODEL must be set in .env")
-    reranked_chunks = await rerank_chunks_with_llm(initial_chunks, question, ollama_base_url, ollama_model, top_k=top_k)
-    # Step 3: Generate answer using LLM with hallucination guard and citations
-    answer, confidence, source_docs = await generate_answer(reranked_chunks, question)
-    return answer, confidence, source_docs
+        return RagContext(query_embedding, [], cache_generation, timings=timings)
+    # Step 2: Rerank with the domain's configured backend (score, cross-encoder or llm)
+    reranker = get_reranker(domain_id)
+    with stage_timer(timings, f"rerank_{reranker.name}"):
+        reranked_chunks = await reranker.rerank(initial_chunks, question, top_k=top_k)
+    # Step 3: Pack the prompt context: drop near-duplicates, fill the token budget
+    with stage_timer(timings, "pack"):
+        packed_chunks, packing = pack_context(reranked_chunks)
+    observe_packing(packing)
+    return RagContext(query_embedding, packed_chunks, cache_generation, timings=timings, packing=packing)
+
+
+# Record a generated answer in the answer cache and package the result
+async def finish_answer(domain_id: str, context: RagContext, answer: str, confidence: float, source_docs: List[dict]) -> RagResult:
+    if answer and confidence > 0:
+        await answer_cache.set(
+            domain_id, context.query_embedding,
+            {"answer": answer, "confidence": confidence, "source_docs": source_docs},
+            context.cache_generation
+        )
+    return RagResult(answer, confidence, source_docs)
+
+
+async def rag_pipeline(
+    db: AsyncSession,
+    question: str,
+    domain_id: str,
+    top_k: int = 5,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    search_mode: str = "vector"
+) -> RagResult:
+    context = await prepare_context(db, question, domain_id, top_k, ef_search, probes, search_mode)
+    timings = context.timings or {}
+    if context.cached is not None:
+        logger.info(f"Stage latency ms (cached): {timings}")
+        return context.cached
+    if not context.chunks:
+        return RagResult(NO_DOCUMENTS_ANSWER, 0.0, [])
+    # Step 4: Generate answer using LLM with hallucination guard and citations
+    with stage_timer(timings, "generate"):
+        answer, confidence, source_docs = await generate_answer(context.chunks, question)
+    logger.info(f"Stage latency ms: {timings}; context packing: {context.packing}")
+    return await finish_answer(domain_id, context, answer, confidence, source_docs)
@@ -0,0 +1,160 @@
+
+import os
+import re
+import json
+import math
+import asyncio
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from loguru import logger
+from app.services.ollama_client import ollama_client
+from app.services.metrics import record_ollama_usage
+
+
+# LLM-based reranking of chunks
+async def rerank_chunks_with_llm(chunks: List[dict], question: str, ollama_base_url: str, ollama_model: str, top_k: int = 5) -> List[dict]:
+    if not chunks:
+        return []
+    # Build rerank prompt with chunk IDs
+    context = "\n".join([f"{i+1}. {chunk['chunk_text']} (Chunk ID: {chunk['chunk_id']})" for i, chunk in enumerate(chunks)])
+    prompt = (
+        f"Given the following context chunks and the question, rank the chunks by relevance to the question.\n"
+        f"Chunks:\n{context}\n\nQuestion: {question}\n"
+        "Return the most relevant chunk numbers as a comma-separated list."
+    )
+    response = await ollama_client.post(
+        f"{ollama_base_url}/api/generate",
+        json={"model": ollama_model, "prompt": prompt, "stream": False},
+        retry_read_timeout=False
+    )
+    if response.status_code == 200:
+        data = response.json()
+        record_ollama_usage("rerank", ollama_model, data)
+        answer = data.get("response", "")
+        # Parse chunk numbers from LLM response
+        match = re.findall(r'\d+', answer)
+        indices = [int(i)-1 for i in match if 0 < int(i) <= len(chunks)]
+        reranked = [chunks[i] for i in indices][:top_k]
+        if reranked:
+            return reranked
+    # Fallback: return original top_k
+    return chunks[:top_k]
+
+
+class Reranker:
+    """Reorders retrieved chunks by relevance to the question and keeps the best top_k."""
+    name = "base"
+
+    async def rerank(self, chunks: List[dict], question: str, top_k: int = 5) -> List[dict]:
+        raise NotImplementedError
+
+
+# Second LLM round trip asking the model to rank chunk numbers (the original reranker)
+class LLMReranker(Reranker):
+    name = "llm"
+
+    async def rerank(self, chunks: List[dict], question: str, top_k: int = 5) -> List[dict]:
+        ollama_base_url = os.getenv("OLLAMA_BASE_URL")
+        ollama_model = os.getenv("OLLAMA_MODEL")
+        if not ollama_base_url or not ollama_model:
+            raise RuntimeError("OLLAMA_BASE_URL and OLLAMA_MODEL must be set in .env")
+        return await rerank_chunks_with_llm(chunks, question, ollama_base_url, ollama_model, top_k=top_k)
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9_\-\.]*")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+# CPU-only scoring: vector similarity from the search distance blended with
+# IDF-weighted lexical overlap (catches exact codes, acronyms and names)
+class ScoreReranker(Reranker):
+    name = "score"
+
+    def __init__(self, vector_weight: float = float(os.getenv("RERANK_VECTOR_WEIGHT", "0.6"))):
+        self.vector_weight = vector_weight
+
+    def score(self, chunks: List[dict], question: str) -> List[float]:
+        distances = [chunk.get("distance") for chunk in chunks]
+        if distances and all(d is not None for d in distances):
+            # Scale-free: best candidate scores 1, others by their distance ratio to it
+            best = min(distances) + 1e-6
+            vector_scores = [best / (d + 1e-6) for d in distances]
+        else:
+            # No distances: fall back to retrieval order
+            vector_scores = [1.0 - i / max(len(chunks), 1) for i in range(len(chunks))]
+        query_terms = set(tokenize(question))
+        chunk_terms = [Counter(tokenize(chunk["chunk_text"])) for chunk in chunks]
+        doc_freq = Counter(term for terms in chunk_terms for term in terms.keys() & query_terms)
+        n = len(chunks)
+        idf = {term: math.log(1 + (n - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5)) for term in query_terms}
+        raw_lexical = [sum(idf[term] for term in query_terms if terms[term]) for terms in chunk_terms]
+        max_lexical = max(raw_lexical) or 1.0
+        lexical_scores = [score / max_lexical for score in raw_lexical]
+        w = self.vector_weight
+        return [w * v + (1 - w) * l for v, l in zip(vector_scores, lexical_scores)]
+
+    async def rerank(self, chunks: List[dict], question: str, top_k: int = 5) -> List[dict]:
+        if not chunks:
+            return []
+        scores = self.score(chunks, question)
+        order = sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True)
+        return [chunks[i] for i in order[:top_k]]
+
+
+# Small local cross-encoder (sentence-transformers), run in a worker pool off the event loop
+class CrossEncoderReranker(Reranker):
+    name = "cross-encoder"
+
+    def __init__(
+        self,
+        model_name: str = os.getenv("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+        workers: int = int(os.getenv("CROSS_ENCODER_WORKERS", "2")),
+    ):
+        from sentence_transformers import CrossEncoder  # optional dependency
+        self.model = CrossEncoder(model_name)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cross-encoder")
+
+    async def rerank(self, chunks: List[dict], question: str, top_k: int = 5) -> List[dict]:
+        if not chunks:
+            return []
+        pairs = [(question, chunk["chunk_text"]) for chunk in chunks]
+        loop = asyncio.get_running_loop()
+        scores = await loop.run_in_executor(self.executor, self.model.predict, pairs)
+        order = sorted(range(len(chunks)), key=lambda i: float(scores[i]), reverse=True)
+        return [chunks[i] for i in order[:top_k]]
+
+
+RERANKERS = {cls.name: cls for cls in (LLMReranker, ScoreReranker, CrossEncoderReranker)}
+RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "score")
+# Per-domain overrides, e.g. {"<domain uuid>": "llm"}
+RERANKER_BY_DOMAIN: Dict[str, str] = json.loads(os.getenv("RERANKER_BY_DOMAIN", "{}"))
+
+_instances: Dict[str, Reranker] = {}
+
+
+def _build(name: str) -> Reranker:
+    if name not in _instances:
+        if name not in RERANKERS:
+            raise ValueError(f"Unknown reranker backend '{name}' (expected one of {sorted(RERANKERS)})")
+        try:
+            _instances[name] = RERANKERS[name]()
+        except ImportError:
+            logger.warning(f"Reranker '{name}' is unavailable (missing dependency); using 'score'")
+            _instances[name] = _instances.get("score") or ScoreReranker()
+    return _instances[name]
+
+
+def get_reranker(domain_id: Optional[str] = None) -> Reranker:
+    name = RERANKER_BY_DOMAIN.get(str(domain_id), RERANKER_BACKEND) if domain_id else RERANKER_BACKEND
+    return _build(name)
+
+
+# Build every configured backend at startup (FastAPI lifespan). Loading a cross-encoder
+# reads, and may download, model weights, which must not happen on the event loop mid-request.
+async def warm_rerankers() -> None:
+    for name in sorted({RERANKER_BACKEND, *RERANKER_BY_DOMAIN.values()}):
+        await asyncio.to_thread(_build, name)
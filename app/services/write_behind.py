@@ -0,0 +1,166 @@
+
+import os
+import time
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+from app.db.database import SessionLocal
+
+# A row to insert: (ORM model, column values)
+Row = Tuple[Any, Dict[str, Any]]
+
+# Queued by stop(): the background task flushes the batch in hand and exits
+_STOP: Any = object()
+
+
+# Multi-row INSERT per model, in first-seen order so parents precede children (FKs).
+# Does not commit: the caller owns the transaction.
+async def insert_rows(db: AsyncSession, rows: List[Row]) -> None:
+    grouped: Dict[Any, List[Dict[str, Any]]] = {}
+    for model, values in rows:
+        grouped.setdefault(model, []).append(values)
+    for model, values in grouped.items():
+        await db.execute(insert(model).values(values))
+
+
+class BatchWriter:
+    """
+    Write-behind buffer for rows that need not be visible before the response returns.
+    A background task drains the queue and inserts up to `batch_size` submissions per
+    transaction, waiting at most `interval` seconds to fill a batch. If a batch fails,
+    its submissions are retried in separate transactions and only the ones that still
+    fail are counted in stats["failed"]. When the queue is
+    full, submit() writes synchronously instead, or drops the rows (counted in
+    stats["dropped"]) if `drop_when_full` is set. Rows still queued when the process
+    dies are lost; on a clean shutdown stop() writes everything submitted so far,
+    including the batch still being collected.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_size: int = 100,
+        interval: float = 0.05,
+        max_queue: int = 10000,
+        session_factory: Any = SessionLocal,
+        drop_when_full: bool = False,
+    ):
+        self.name = name
+        self.drop_when_full = drop_when_full
+        self.batch_size = batch_size
+        self.interval = interval
+        self.session_factory = session_factory
+        self.queue: "asyncio.Queue[List[Row]]" = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {"submitted": 0, "written": 0, "batches": 0, "direct": 0, "dropped": 0, "failed": 0}
+
+    def metrics(self) -> Dict[str, int]:
+        return dict(self.stats, queue_depth=self.queue.qsize())
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            # Not cancelled: a batch being collected or written would be lost
+            await self.queue.put(_STOP)
+            await self._task
+            self._task = None
+        # Flush submissions that arrived after the stop marker
+        while not self.queue.empty():
+            await self.flush(self._drain(self.batch_size))
+
+    async def submit(self, rows: List[Row]) -> None:
+        self.stats["submitted"] += 1
+        if self._task is None:
+            # Not started (e.g. a Celery worker): write now
+            await self.flush([rows])
+            return
+        try:
+            self.queue.put_nowait(rows)
+        except asyncio.QueueFull:
+            if self.drop_when_full:
+                self.stats["dropped"] += 1
+                return
+            # Backpressure: the caller pays for its own write rather than losing it
+            self.stats["direct"] += 1
+            await self._write([rows])
+
+    def _drain(self, limit: int) -> List[List[Row]]:
+        batch = []
+        while len(batch) < limit and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = await self.queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows = await asyncio.wait_for(self.queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if rows is _STOP:
+                    stopping = True
+                    break
+                batch.append(rows)
+            await self.flush(batch)
+
+    async def flush(self, batch: List[List[Row]]) -> None:
+        if not batch:
+            return
+        try:
+            await self._write(batch)
+            self.stats["batches"] += 1
+            return
+        except Exception:
+            if len(batch) == 1:
+                self.stats["failed"] += 1
+                logger.exception(f"{self.name} write-behind submission failed")
+                return
+            logger.warning(f"{self.name} write-behind batch of {len(batch)} submissions failed; retrying one by one")
+        # One bad submission (e.g. an FK violation) must not discard the rest of the batch
+        for rows in batch:
+            try:
+                await self._write([rows])
+            except Exception:
+                self.stats["failed"] += 1
+                logger.exception(f"{self.name} write-behind submission failed")
+
+    async def _write(self, batch: List[List[Row]]) -> None:
+        async with self.session_factory() as db:
+            await insert_rows(db, [row for rows in batch for row in rows])
+            await db.commit()
+        self.stats["written"] += len(batch)
+
+
+# Question/answer/escalation rows from /questions/ask when ASK_WRITE_BEHIND is enabled
+ASK_WRITE_BEHIND = os.getenv("ASK_WRITE_BEHIND", "false").lower() == "true"
+exchange_writer = BatchWriter(
+    "exchange",
+    batch_size=int(os.getenv("WRITE_BEHIND_BATCH", "100")),
+    interval=float(os.getenv("WRITE_BEHIND_INTERVAL", "0.05")),
+    max_queue=int(os.getenv("WRITE_BEHIND_QUEUE", "10000")),
+)
+
+
+# audit_logs rows from utils.logging.log_action; dropped rather than slowing requests down
+AUDIT_LOG_ENABLED = os.getenv("AUDIT_LOG_ENABLED", "true").lower() == "true"
+audit_writer = BatchWriter(
+    "audit",
+    batch_size=int(os.getenv("AUDIT_LOG_BATCH", "200")),
+    interval=float(os.getenv("AUDIT_LOG_INTERVAL", "1.0")),
+    max_queue=int(os.getenv("AUDIT_LOG_QUEUE", "10000")),
+    drop_when_full=True,
+)
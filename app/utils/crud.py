@@ -1,13 +1,92 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, delete, tuple_
 from app.db import schemas, models
-from typing import Optional
+from app.db.database import ReadSessionLocal
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from datetime import datetime
+import base64
+import json
 import uuid
 
-# List all documents
-async def list_documents(db: AsyncSession):
-    result = await db.execute(select(models.Document))
-    return result.scalars().all()
+# Listing page size: default and hard cap
+LIST_PAGE_SIZE = 100
+LIST_MAX_PAGE_SIZE = 1000
+
+# Columns returned by document listings (no `content`)
+DOCUMENT_LIST_COLUMNS = (
+    models.Document.id, models.Document.title, models.Document.domain_id, models.Document.uploaded_by,
+    models.Document.uploaded_at, models.Document.version, models.Document.tags,
+    models.Document.file_type, models.Document.status,
+)
+ESCALATION_LIST_COLUMNS = (
+    models.Escalation.id, models.Escalation.question_id, models.Escalation.user_id,
+    models.Escalation.status, models.Escalation.created_at,
+)
+
+
+# Opaque keyset cursor: the (timestamp, id) of the last row on the previous page
+def encode_cursor(ts: datetime, row_id: Any) -> str:
+    return base64.urlsafe_b64encode(f"{ts.isoformat()}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        ts, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(ts), uuid.UUID(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+# Newest first; the (ts, id) tuple comparison matches the composite index
+def _keyset(query, ts_column, id_column, cursor: Optional[str]):
+    if cursor:
+        query = query.where(tuple_(ts_column, id_column) < tuple_(*decode_cursor(cursor)))
+    return query.order_by(ts_column.desc(), id_column.desc())
+
+
+async def _page(db: AsyncSession, query, ts_field: str, limit: Optional[int]) -> Tuple[List[Any], Optional[str]]:
+    limit = min(limit or LIST_PAGE_SIZE, LIST_MAX_PAGE_SIZE)
+    rows = (await db.execute(query.limit(limit + 1))).mappings().all()
+    if len(rows) <= limit:
+        return list(rows), None
+    last = rows[limit - 1]
+    return list(rows[:limit]), encode_cursor(last[ts_field], last["id"])
+
+
+async def stream_rows(db: AsyncSession, query) -> AsyncIterator[Dict[str, Any]]:
+    # Server-side cursor: rows are fetched in batches instead of loaded all at once
+    result = await db.stream(query.execution_options(yield_per=500))
+    async for row in result.mappings():
+        yield dict(row)
+
+
+# NDJSON export for StreamingResponse; owns its session because it outlives the request handler
+async def stream_ndjson(query) -> AsyncIterator[str]:
+    async with ReadSessionLocal() as db:  # type: ignore
+        async for row in stream_rows(db, query):
+            yield json.dumps(row, default=str) + "\n"
+
+
+def documents_query(
+    cursor: Optional[str] = None,
+    domain_id: Optional[str] = None,
+    status: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+):
+    query = select(*DOCUMENT_LIST_COLUMNS)
+    if domain_id:
+        query = query.where(models.Document.domain_id == domain_id)
+    if status:
+        query = query.where(models.Document.status == status)
+    if tags:
+        # JSONB containment: every requested tag must be present
+        query = query.where(models.Document.tags.contains(tags))
+    return _keyset(query, models.Document.uploaded_at, models.Document.id, cursor)
+
+
+# List documents, one keyset page at a time; returns (rows, next cursor or None)
+async def list_documents(db: AsyncSession, limit: Optional[int] = None, cursor: Optional[str] = None, **filters):
+    return await _page(db, documents_query(cursor, **filters), "uploaded_at", limit)
 
 # Get document by ID
 async def get_document_by_id(db: AsyncSession, doc_id: str):
@@ -19,9 +98,17 @@ async def update_document(db: AsyncSession, doc_id: str, doc_update):
     doc = await get_document_by_id(db, doc_id)
     if not doc:
         return None
+    old_domain_id = doc.domain_id
     for field, value in doc_update.dict(exclude_unset=True).items():
         setattr(doc, field, value)
     db.add(doc)
+    # Keep the denormalized domain_id on embeddings in sync, in the same transaction
+    if doc.domain_id != old_domain_id:
+        await db.execute(
+            update(models.DocumentEmbedding)
+            .where(models.DocumentEmbedding.document_id == doc.id)
+            .values(domain_id=doc.domain_id)
+        )
     await db.commit()
     await db.refresh(doc)
     return doc
@@ -31,13 +118,23 @@ async def delete_document(db: AsyncSession, doc_id: str):
     doc = await get_document_by_id(db, doc_id)
     if not doc:
         return False
+    # Search filters on the denormalized domain_id without joining documents, so chunks
+    # must go with their document (the relationship would only NULL their document_id)
+    await db.execute(delete(models.DocumentEmbedding).where(models.DocumentEmbedding.document_id == doc.id))
     await db.delete(doc)
     await db.commit()
     return True
 
-async def get_escalations(db: AsyncSession):
-    result = await db.execute(select(models.Escalation))
-    return result.scalars().all()
+def escalations_query(cursor: Optional[str] = None, status: Optional[str] = None):
+    query = select(*ESCALATION_LIST_COLUMNS)
+    if status:
+        query = query.where(models.Escalation.status == status)
+    return _keyset(query, models.Escalation.created_at, models.Escalation.id, cursor)
+
+
+# List escalations, one keyset page at a time; returns (rows, next cursor or None)
+async def get_escalations(db: AsyncSession, limit: Optional[int] = None, cursor: Optional[str] = None, status: Optional[str] = None):
+    return await _page(db, escalations_query(cursor, status), "created_at", limit)
 
 async def resolve_escalation(db: AsyncSession, escalation_id: str):
     result = await db.execute(select(models.Escalation).where(models.Escalation.id == escalation_id))
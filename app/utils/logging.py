@@ -1,4 +1,7 @@
+import uuid
 import logging
+from datetime import datetime, timezone
+from typing import Any, Optional
 from loguru import logger
 
 # Configure loguru for FastAPI
@@ -7,6 +10,27 @@ logger.add("logs/knowledgehub.log", rotation="10 MB")
 # Standard logging setup
 logging.basicConfig(level=logging.INFO)
 
-# Log user actions for audit
-async def log_action(user_id: str, action: str, target_id: str) -> None:
+
+def _as_uuid(value: Any) -> Optional[uuid.UUID]:
+    try:
+        return uuid.UUID(str(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+# Log user actions for audit: a loguru line plus an audit_logs row, written in batches
+# by the background audit writer (see services.write_behind). An event whose user no
+# longer exists fails its FK on its own; the rest of its batch is still written.
+async def log_action(user_id: str, action: str, target_id: Any) -> None:
     logger.info(f"User {user_id} performed {action} on {target_id}")
+    from app.db.models import AuditLog
+    from app.services.write_behind import audit_writer, AUDIT_LOG_ENABLED
+    if not AUDIT_LOG_ENABLED:
+        return
+    await audit_writer.submit([(AuditLog, {
+        "id": uuid.uuid4(),
+        "user_id": _as_uuid(user_id),
+        "action": action,
+        "target_id": _as_uuid(target_id),
+        "timestamp": datetime.now(timezone.utc),
+    })])
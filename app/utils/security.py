@@ -2,17 +2,61 @@ from passlib.context import CryptContext
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from typing import Any
+from typing import Any, Callable, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
 import os
+import time
+import asyncio
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.database import get_db
+from app.db.database import SessionLocal
 from app.db.models import Role
+from app.services.cache import TTLCache
 
 SECRET_KEY = os.getenv("SECRET_KEY", "changeme")
 ALGORITHM = "HS256"
+# Role lookups are cached per process; embedding them in the JWT skips even the first lookup,
+# but a role change then only takes effect when the user logs in again. Such tokens expire
+# after JWT_ROLE_CLAIMS_TTL seconds, so stale permissions live no longer than cached ones.
+ROLE_CACHE_TTL = float(os.getenv("ROLE_CACHE_TTL", "300"))
+JWT_EMBED_PERMISSIONS = os.getenv("JWT_EMBED_PERMISSIONS", "false").lower() == "true"
+JWT_ROLE_CLAIMS_TTL = float(os.getenv("JWT_ROLE_CLAIMS_TTL", str(ROLE_CACHE_TTL)))
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# bcrypt runs in its own thread pool so a login burst cannot stall the event loop or
+# starve other to_thread work; beyond workers + queue, requests get 503
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "64"))
+
+_hash_pool: Optional[ThreadPoolExecutor] = None
+_hash_inflight = 0
+
+
+def get_hash_pool() -> ThreadPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _hash_pool
+
+
+def shutdown_hash_pool() -> None:
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
+
+async def run_password_task(fn: Callable[..., Any], *args: Any) -> Any:
+    global _hash_inflight
+    if _hash_inflight >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE:
+        raise HTTPException(status_code=503, detail="Server busy, retry shortly", headers={"Retry-After": "1"})
+    _hash_inflight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(get_hash_pool(), fn, *args)
+    finally:
+        _hash_inflight -= 1
+
 # Hash password
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
@@ -21,10 +65,56 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+# Async variants for request handlers
+async def hash_password_async(password: str) -> str:
+    return await run_password_task(get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await run_password_task(verify_password, plain_password, hashed_password)
+
 # Create JWT token
-def create_access_token(data: dict) -> str:
+def create_access_token(data: dict, expires_in: Optional[float] = None) -> str:
+    if expires_in is not None:
+        data = dict(data, exp=int(time.time() + expires_in))
     return jwt.encode(data, SECRET_KEY, algorithm=ALGORITHM)
 
+class RoleResolver:
+    """
+    In-process cache of role id -> {"name", "permissions"} with a TTL. Unknown role ids
+    are cached too. Call invalidate() after changing roles; other processes pick up
+    the change when their entries expire.
+    """
+
+    def __init__(self, ttl: float = ROLE_CACHE_TTL):
+        self.cache = TTLCache(maxsize=1024, ttl=ttl)
+
+    async def resolve(self, role_id: Any, db: Optional[AsyncSession] = None) -> Dict[str, Any]:
+        if not role_id:
+            return {}
+        key = str(role_id)
+        role = self.cache.get(key)
+        if role is not None:
+            return role
+        query = select(Role.name, Role.permissions).where(Role.id == key)
+        if db is not None:
+            row = (await db.execute(query)).first()
+        else:
+            async with SessionLocal() as session:  # type: ignore
+                row = (await session.execute(query)).first()
+        role = {"name": row.name, "permissions": row.permissions} if row else {}
+        self.cache.set(key, role)
+        return role
+
+    def invalidate(self, role_id: Any = None) -> None:
+        if role_id is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(str(role_id))
+
+
+role_resolver = RoleResolver()
+
+
 # Get current user from token
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> Any:
     try:
@@ -33,17 +123,39 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> Any:
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
         # Dummy: Replace with DB lookup
-        return {"id": user_id, "role_id": payload.get("role")}
+        user = {"id": user_id, "role_id": payload.get("role")}
+        if "role_name" in payload:
+            # Resolved at login (JWT_EMBED_PERMISSIONS)
+            user["role"] = {"name": payload["role_name"], "permissions": payload.get("permissions")}
+        return user
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+
+async def get_user_role(user: Any, db: Optional[AsyncSession] = None) -> Dict[str, Any]:
+    role = user.get("role")
+    if role is None:
+        role = await role_resolver.resolve(user.get("role_id"), db)
+    return role
+
+
+# Permissions are stored either as a list of names or as {name: bool}
+def has_permission(role: Dict[str, Any], permission: str) -> bool:
+    if role.get("name") == "admin":
+        return True
+    permissions = role.get("permissions") or []
+    if isinstance(permissions, dict):
+        return bool(permissions.get(permission))
+    return permission in permissions
+
+
 # Require admin role
-async def require_admin(user: Any, db: AsyncSession = Depends(get_db)) -> None:
-    role_id = user.get("role_id")
-    if not role_id:
-        raise HTTPException(status_code=403, detail="Admin access required")
-    # Query role name from DB
-    result = await db.execute(Role.__table__.select().where(Role.id == role_id))
-    role = result.fetchone()
-    if not role or role.name != "admin":
+async def require_admin(user: Any, db: Optional[AsyncSession] = None) -> None:
+    role = await get_user_role(user, db)
+    if role.get("name") != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
+
+
+async def require_permission(user: Any, permission: str, db: Optional[AsyncSession] = None) -> None:
+    if not has_permission(await get_user_role(user, db), permission):
+        raise HTTPException(status_code=403, detail=f"Permission '{permission}' required")
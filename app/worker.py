@@ -0,0 +1,39 @@
+import os
+import asyncio
+from celery import Celery
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+celery_app = Celery("knowledgehub", broker=REDIS_URL, backend=REDIS_URL)
+celery_app.conf.update(
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+)
+
+
+async def _run_job(document_id: str, path: str, user_id=None, incremental: bool = False) -> None:
+    from app.db.database import dispose_engines
+    from app.services.cache import close_redis
+    from app.services.ingest_jobs import run_ingest_job
+    from app.services.ollama_client import ollama_client
+    try:
+        await run_ingest_job(document_id, path, user_id, incremental)
+    finally:
+        # Pooled connections are bound to this task's event loop
+        await ollama_client.close()
+        await close_redis()
+        await dispose_engines()
+
+
+# Celery entry point: run ingest_document for a saved upload
+@celery_app.task(name="ingest_document", bind=True, max_retries=3)
+def ingest_document_task(self, document_id: str, path: str, user_id=None, incremental: bool = False) -> None:
+    from app.services.ollama_client import OllamaUnavailableError
+    try:
+        asyncio.run(_run_job(document_id, path, user_id, incremental))
+    except OllamaUnavailableError as e:
+        # Model server outages are transient: retry with backoff
+        raise self.retry(exc=e, countdown=30 * (2 ** self.request.retries))
@@ -0,0 +1,85 @@
+"""
+Compare DocumentEmbedding write throughput: one ORM object per chunk (the previous
+ingest path) versus multi-row INSERT batches (bulk_insert_embeddings).
+
+Needs a migrated database in DATABASE_URL. Creates a scratch domain/document and
+removes it afterwards.
+
+    python -m benchmarks.bench_embedding_insert --rows 5000 --batch-size 500
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from sqlalchemy import delete, func
+
+from app.db.database import SessionLocal, engine
+from app.db.models import Document, DocumentEmbedding, Domain, TEXT_SEARCH_CONFIG
+from app.services.ingest_pipeline import bulk_insert_embeddings, embedding_row
+
+DIM = 768
+
+
+def fake_chunks(n: int):
+    rng = random.Random(42)
+    words = ["policy", "leave", "server", "reset", "password", "invoice", "E-4012", "VPN", "benefits", "audit"]
+    for _ in range(n):
+        text = " ".join(rng.choice(words) for _ in range(150))
+        yield text, [rng.random() for _ in range(DIM)]
+
+
+async def orm_path(db, document, rows: int) -> None:
+    for chunk, vector in fake_chunks(rows):
+        db.add(DocumentEmbedding(
+            document_id=document.id, domain_id=document.domain_id, chunk_text=chunk, vector=vector,
+            chunk_tsv=func.to_tsvector(TEXT_SEARCH_CONFIG, chunk)
+        ))
+    await db.commit()
+
+
+async def bulk_path(db, document, rows: int, batch_size: int) -> None:
+    batch = []
+    for chunk, vector in fake_chunks(rows):
+        batch.append(embedding_row(document, chunk, vector))
+        if len(batch) >= batch_size:
+            await bulk_insert_embeddings(db, batch, batch_size)
+            batch = []
+    if batch:
+        await bulk_insert_embeddings(db, batch, batch_size)
+
+
+async def main(rows: int, batch_size: int) -> None:
+    results = {"rows": rows, "batch_size": batch_size}
+    async with SessionLocal() as db:  # type: ignore
+        domain = Domain(id=uuid.uuid4(), name=f"bench-{uuid.uuid4().hex[:8]}")
+        document = Document(id=uuid.uuid4(), title="bench", content="", domain_id=domain.id, status="ready")
+        db.add_all([domain, document])
+        await db.commit()
+        try:
+            for name, run in (("orm", lambda: orm_path(db, document, rows)),
+                              ("bulk", lambda: bulk_path(db, document, rows, batch_size))):
+                started = time.perf_counter()
+                await run()
+                elapsed = time.perf_counter() - started
+                results[name] = {"seconds": round(elapsed, 3), "rows_per_sec": round(rows / elapsed, 1)}
+                db.expunge_all()
+                await db.execute(delete(DocumentEmbedding).where(DocumentEmbedding.document_id == document.id))
+                await db.commit()
+        finally:
+            await db.execute(delete(Document).where(Document.id == document.id))
+            await db.execute(delete(Domain).where(Domain.id == domain.id))
+            await db.commit()
+    await engine.dispose()
+    results["speedup"] = round(results["bulk"]["rows_per_sec"] / results["orm"]["rows_per_sec"], 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.batch_size))
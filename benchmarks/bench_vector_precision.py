@@ -0,0 +1,107 @@
+"""
+Recall and latency of vector_search by precision: exact search (no index) as ground
+truth versus the full-precision HNSW index and the halfvec / binary-quantized coarse
+searches with full-precision re-ranking (VECTOR_SEARCH_PRECISION).
+
+Needs a migrated database in DATABASE_URL, including add_compact_vector_indexes.
+Creates a scratch domain/document with seeded clustered vectors and removes it afterwards.
+
+    python -m benchmarks.bench_vector_precision --rows 20000 --queries 200 --top-k 10
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from typing import List
+
+from sqlalchemy import delete, func, select, text
+
+from app.db.database import SessionLocal, engine
+from app.db.models import Document, DocumentEmbedding, Domain
+from app.services import rag_pipeline
+from app.services.ingest_pipeline import bulk_insert_embeddings, embedding_row
+from benchmarks.load import percentile
+
+DIM = rag_pipeline.VECTOR_DIM
+PRECISIONS = ("full", "halfvec", "binary")
+INDEXES = {
+    "full": "ix_document_embeddings_vector",
+    "halfvec": "ix_document_embeddings_vector_halfvec",
+    "binary": "ix_document_embeddings_vector_binary",
+}
+
+
+def normalize(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def clustered_vectors(rng: random.Random, n: int, centers: List[List[float]], spread: float = 0.35):
+    # Unit vectors scattered around topic centers, like embeddings of related chunks
+    for _ in range(n):
+        center = rng.choice(centers)
+        yield normalize([c + rng.gauss(0.0, spread / math.sqrt(DIM)) for c in center])
+
+
+async def search(db, domain_id, query: List[float], top_k: int, precision: str, exact: bool = False) -> List[str]:
+    if exact:
+        # Ground truth: sequential scan over every row
+        await db.execute(select(func.set_config("enable_indexscan", "off", True)))
+    rows = await rag_pipeline.vector_search(db, "", domain_id, top_k, query_embedding=query, precision=precision)
+    await db.rollback()
+    return [r["chunk_id"] for r in rows]
+
+
+async def main(rows: int, queries: int, top_k: int, seed: int) -> None:
+    rng = random.Random(seed)
+    centers = [normalize([rng.gauss(0.0, 1.0) for _ in range(DIM)]) for _ in range(max(1, rows // 500))]
+    results = {"rows": rows, "queries": queries, "top_k": top_k, "oversample": rag_pipeline.VECTOR_RERANK_OVERSAMPLE}
+    async with SessionLocal() as db:  # type: ignore
+        domain = Domain(id=uuid.uuid4(), name=f"bench-{uuid.uuid4().hex[:8]}")
+        document = Document(id=uuid.uuid4(), title="bench", content="", domain_id=domain.id, status="ready")
+        db.add_all([domain, document])
+        await db.commit()
+        try:
+            batch = [embedding_row(document, f"chunk {i}", v) for i, v in enumerate(clustered_vectors(rng, rows, centers))]
+            await bulk_insert_embeddings(db, batch)
+            await db.execute(text("ANALYZE document_embeddings"))
+            await db.commit()
+            probes = list(clustered_vectors(rng, queries, centers))
+            truth = [set(await search(db, domain.id, q, top_k, "full", exact=True)) for q in probes]
+
+            for precision in PRECISIONS:
+                latencies, hits = [], 0
+                for q, expected in zip(probes, truth):
+                    started = time.perf_counter()
+                    found = await search(db, domain.id, q, top_k, precision)
+                    latencies.append(time.perf_counter() - started)
+                    hits += len(expected.intersection(found))
+                latencies.sort()
+                size = await db.scalar(select(func.pg_relation_size(func.to_regclass(INDEXES[precision]))))
+                results[precision] = {
+                    f"recall@{top_k}": round(hits / max(1, sum(len(t) for t in truth)), 4),
+                    "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                    "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+                    "index_mb": round(size / 2**20, 1) if size is not None else None,
+                }
+        finally:
+            await db.rollback()
+            await db.execute(delete(DocumentEmbedding).where(DocumentEmbedding.document_id == document.id))
+            await db.execute(delete(Document).where(Document.id == document.id))
+            await db.execute(delete(Domain).where(Domain.id == domain.id))
+            await db.commit()
+    await engine.dispose()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.queries, args.top_k, args.seed))
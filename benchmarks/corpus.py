@@ -0,0 +1,67 @@
+"""
+Seeded synthetic corpus for benchmarks: text documents built from a small vocabulary
+per topic plus questions answerable from them. The same seed always yields the same
+files, so runs are comparable.
+
+    python -m benchmarks.corpus --docs 200 --paragraphs 40 --out bench_corpus --seed 42
+"""
+import argparse
+import json
+import os
+import random
+from typing import Dict, List, Tuple
+
+TOPICS: Dict[str, List[str]] = {
+    "hr": ["leave", "benefits", "payroll", "onboarding", "manager", "approval", "holiday", "contract", "appraisal"],
+    "it": ["VPN", "password", "laptop", "ticket", "firewall", "E-4012", "reset", "license", "backup"],
+    "finance": ["invoice", "expense", "budget", "reimbursement", "audit", "vendor", "quarter", "receipt", "ledger"],
+}
+FILLER = ["the", "a", "must", "should", "within", "days", "team", "request", "policy", "process", "is", "for", "and"]
+
+
+def paragraph(rng: random.Random, topic: str, sentences: int = 5) -> str:
+    words = TOPICS[topic]
+    out = []
+    for _ in range(sentences):
+        n = rng.randint(10, 20)
+        sentence = " ".join(rng.choice(words) if rng.random() < 0.35 else rng.choice(FILLER) for _ in range(n))
+        out.append(sentence.capitalize() + ".")
+    return " ".join(out)
+
+
+def generate(docs: int, paragraphs: int, seed: int) -> Tuple[List[dict], List[dict]]:
+    """Return (documents, questions); documents are {"filename", "title", "topic", "text"}."""
+    rng = random.Random(seed)
+    documents, questions = [], []
+    topics = sorted(TOPICS)
+    for i in range(docs):
+        topic = topics[i % len(topics)]
+        text = "\n\n".join(paragraph(rng, topic) for _ in range(paragraphs))
+        documents.append({"filename": f"{topic}-{i:05d}.txt", "title": f"{topic.upper()} handbook {i}", "topic": topic, "text": text})
+        keyword = rng.choice(TOPICS[topic])
+        questions.append({"topic": topic, "question_text": f"What is the {topic} policy for {keyword} requests?"})
+    return documents, questions
+
+
+def write_corpus(out_dir: str, docs: int, paragraphs: int, seed: int) -> str:
+    documents, questions = generate(docs, paragraphs, seed)
+    os.makedirs(out_dir, exist_ok=True)
+    for doc in documents:
+        with open(os.path.join(out_dir, doc["filename"]), "w", encoding="utf-8") as fh:
+            fh.write(doc["text"])
+    # manifest.json matches the bulk upload format
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as fh:
+        json.dump([{"filename": d["filename"], "title": d["title"], "tags": [d["topic"]]} for d in documents], fh, indent=1)
+    with open(os.path.join(out_dir, "questions.json"), "w", encoding="utf-8") as fh:
+        json.dump(questions, fh, indent=1)
+    return out_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--paragraphs", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="bench_corpus")
+    args = parser.parse_args()
+    print(write_corpus(args.out, args.docs, args.paragraphs, args.seed))
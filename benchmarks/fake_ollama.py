@@ -0,0 +1,124 @@
+"""
+Local stand-in for the Ollama API, for load tests without a GPU or model downloads.
+
+Implements /api/embeddings, /api/embed and /api/generate (streaming and not) with
+configurable latency and token rate. Embeddings are deterministic per text (seeded
+from its hash), and responses carry the same token-count and duration fields as Ollama.
+
+    python -m benchmarks.fake_ollama --port 11435 --embed-latency-ms 15 --tokens-per-sec 40
+    OLLAMA_BASE_URL=http://localhost:11435 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER_WORDS = (
+    "According to the policy in chunk 1 employees must submit the request through the portal "
+    "and their manager approves it within five business days"
+).split()
+
+
+def fake_embedding(text: str, dim: int) -> List[float]:
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    vector = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def count_tokens(text: str) -> int:
+    # Rough Llama-style estimate: ~4 characters per token
+    return max(1, len(text) // 4)
+
+
+def create_app(
+    dim: int = 768,
+    embed_latency_ms: float = 10.0,
+    first_token_ms: float = 150.0,
+    tokens_per_sec: float = 50.0,
+    answer_tokens: int = 60,
+) -> FastAPI:
+    app = FastAPI(title="fake-ollama")
+    token_interval = 1.0 / tokens_per_sec if tokens_per_sec > 0 else 0.0
+
+    def usage(prompt: str, eval_count: int, started: float) -> Dict[str, Any]:
+        total_ns = int((time.perf_counter() - started) * 1e9)
+        eval_ns = int(eval_count * token_interval * 1e9)
+        return {
+            "prompt_eval_count": count_tokens(prompt),
+            "eval_count": eval_count,
+            "load_duration": 0,
+            "prompt_eval_duration": int(first_token_ms * 1e6),
+            "eval_duration": eval_ns,
+            "total_duration": total_ns,
+        }
+
+    @app.post("/api/embeddings")
+    async def embeddings(request: Request) -> JSONResponse:
+        body = await request.json()
+        await asyncio.sleep(embed_latency_ms / 1000)
+        return JSONResponse({"embedding": fake_embedding(body.get("prompt", ""), dim)})
+
+    @app.post("/api/embed")
+    async def embed(request: Request) -> JSONResponse:
+        body = await request.json()
+        inputs = body.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        started = time.perf_counter()
+        # Batched calls amortize per-request overhead: latency grows sublinearly
+        await asyncio.sleep(embed_latency_ms / 1000 * (1 + 0.1 * max(0, len(inputs) - 1)))
+        return JSONResponse({
+            "model": body.get("model"),
+            "embeddings": [fake_embedding(text, dim) for text in inputs],
+            "prompt_eval_count": sum(count_tokens(text) for text in inputs),
+            "total_duration": int((time.perf_counter() - started) * 1e9),
+        })
+
+    @app.post("/api/generate")
+    async def generate(request: Request) -> Any:
+        body = await request.json()
+        prompt = body.get("prompt", "")
+        model = body.get("model")
+        started = time.perf_counter()
+        words = [ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(answer_tokens)]
+        if not body.get("stream", True):
+            await asyncio.sleep(first_token_ms / 1000 + answer_tokens * token_interval)
+            return JSONResponse(dict(
+                {"model": model, "response": " ".join(words), "done": True}, **usage(prompt, answer_tokens, started)
+            ))
+
+        async def lines():
+            await asyncio.sleep(first_token_ms / 1000)
+            for i, word in enumerate(words):
+                yield json.dumps({"model": model, "response": (" " if i else "") + word, "done": False}) + "\n"
+                await asyncio.sleep(token_interval)
+            yield json.dumps(dict({"model": model, "response": "", "done": True}, **usage(prompt, answer_tokens, started))) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--embed-latency-ms", type=float, default=10.0)
+    parser.add_argument("--first-token-ms", type=float, default=150.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(args.dim, args.embed_latency_ms, args.first_token_ms, args.tokens_per_sec, args.answer_tokens),
+        host=args.host, port=args.port, log_level="warning",
+    )
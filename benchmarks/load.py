@@ -0,0 +1,208 @@
+"""
+Load scenarios against a running API: /auth/login, /questions/ask and /documents/upload.
+The mixed scenario runs login and ask together, so ask latency is measured during a login
+burst. Reports p50/p95/p99 latency and requests/sec per scenario and saves the results as
+JSON so runs can be compared across commits.
+
+Typical setup, with Ollama replaced by benchmarks.fake_ollama:
+
+    python -m benchmarks.fake_ollama --port 11435 &
+    OLLAMA_BASE_URL=http://localhost:11435 uvicorn app.main:app --port 8000 &
+    python -m benchmarks.corpus --docs 200 --out bench_corpus
+    python -m benchmarks.load --scenario all --corpus bench_corpus --domain-id <uuid> --domain-name HR \\
+        --admin-email admin@example.com --admin-password secret --out results.json
+
+The upload scenario needs an admin account; ask, mixed and login use a user registered
+on the fly.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import subprocess
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from jose import jwt
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    # Nearest-rank percentile on an ascending list
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    values = sorted(latencies)
+
+    def ms(seconds: float) -> float:
+        return round(seconds * 1000, 2)
+    return {
+        "requests": len(values) + errors,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(values) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "mean_ms": ms(sum(values) / len(values)) if values else 0.0,
+        "max_ms": ms(values[-1]) if values else 0.0,
+    }
+
+
+async def run_scenario(request: Callable[[int], Awaitable[bool]], requests: int, concurrency: int) -> Dict[str, Any]:
+    """Issue `requests` calls from `concurrency` workers; request(i) returns True on success."""
+    latencies: List[float] = []
+    errors = 0
+    counter = itertools.count()
+
+    async def worker() -> None:
+        nonlocal errors
+        while (i := next(counter)) < requests:
+            started = time.perf_counter()
+            try:
+                ok = await request(i)
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run_mixed(login: Callable[[int], Awaitable[bool]], ask: Callable[[int], Awaitable[bool]],
+                    requests: int, concurrency: int) -> Dict[str, Any]:
+    """Run the login and ask scenarios at the same time so ask latency reflects a login burst."""
+    login_result, ask_result = await asyncio.gather(
+        run_scenario(login, requests, concurrency), run_scenario(ask, requests, concurrency)
+    )
+    return {"login": login_result, "ask": ask_result}
+
+
+async def login(client: httpx.AsyncClient, email: str, password: str) -> str:
+    response = await client.post("/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def bench_user(client: httpx.AsyncClient) -> Dict[str, str]:
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    password = "bench-password"
+    response = await client.post("/auth/register", json={"name": "Bench", "email": email, "password": password, "role_id": None})
+    response.raise_for_status()
+    token = await login(client, email, password)
+    return {"email": email, "password": password, "token": token, "id": jwt.get_unverified_claims(token)["sub"]}
+
+
+def load_corpus(corpus: Optional[str]) -> Dict[str, Any]:
+    if not corpus:
+        return {"files": [], "questions": [{"question_text": "What is the leave approval policy?"}]}
+    with open(os.path.join(corpus, "questions.json"), encoding="utf-8") as fh:
+        questions = json.load(fh)
+    files = sorted(f for f in os.listdir(corpus) if f.endswith(".txt"))
+    return {"files": [os.path.join(corpus, f) for f in files], "questions": questions}
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    corpus = load_corpus(args.corpus)
+    scenarios = ["login", "ask", "mixed", "upload"] if args.scenario == "all" else [args.scenario]
+    results: Dict[str, Any] = {"meta": {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip(),
+        "args": vars(args),
+    }, "scenarios": {}}
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        user = await bench_user(client)
+        auth = {"Authorization": f"Bearer {user['token']}"}
+
+        async def do_login(i: int) -> bool:
+            r = await client.post("/auth/login", json={"email": user["email"], "password": user["password"]})
+            return r.status_code == 200
+
+        async def do_ask(i: int) -> bool:
+            questions = corpus["questions"]
+            r = await client.post(args.ask_path, headers=auth, json={
+                "user_id": user["id"], "domain_id": args.domain_id, "search_mode": args.search_mode,
+                "question_text": questions[i % len(questions)]["question_text"],
+            })
+            return r.status_code == 200
+
+        if ("ask" in scenarios or "mixed" in scenarios) and not (args.domain_id and corpus["questions"]):
+            raise SystemExit("--domain-id and --corpus are required for the ask and mixed scenarios")
+
+        if "login" in scenarios:
+            results["scenarios"]["login"] = await run_scenario(do_login, args.requests, args.concurrency)
+
+        if "ask" in scenarios:
+            results["scenarios"]["ask"] = await run_scenario(do_ask, args.requests, args.concurrency)
+
+        if "mixed" in scenarios:
+            # Ask p95/p99 while logins saturate the password-hash pool
+            results["scenarios"]["mixed"] = await run_mixed(do_login, do_ask, args.requests, args.concurrency)
+
+        if "upload" in scenarios:
+            if not (args.admin_email and args.domain_name and corpus["files"]):
+                raise SystemExit("upload needs --admin-email/--admin-password, --domain-name and --corpus")
+            admin = {"Authorization": f"Bearer {await login(client, args.admin_email, args.admin_password)}"}
+            files = corpus["files"]
+            job_ids: List[str] = []
+
+            async def do_upload(i: int) -> bool:
+                path = files[i % len(files)]
+                with open(path, "rb") as fh:
+                    r = await client.post("/documents/upload", headers=admin, data={
+                        "title": f"bench {os.path.basename(path)} {i}", "domain_name": args.domain_name,
+                    }, files={"file": (os.path.basename(path), fh.read(), "text/plain")})
+                if r.status_code == 202:
+                    job_ids.append(r.json()["job_id"])
+                return r.status_code == 202
+            upload_started = time.perf_counter()
+            results["scenarios"]["upload"] = await run_scenario(do_upload, args.requests, args.concurrency)
+            if args.wait_ingest:
+                # End-to-end ingest throughput: wait for every queued job to finish
+                pending = set(job_ids)
+                while pending:
+                    await asyncio.sleep(0.5)
+                    for job_id in list(pending):
+                        r = await client.get(f"/documents/jobs/{job_id}", headers=admin)
+                        if r.status_code == 200 and r.json()["status"] in ("ready", "failed"):
+                            pending.discard(job_id)
+                elapsed = time.perf_counter() - upload_started
+                results["scenarios"]["upload"]["ingest_seconds"] = round(elapsed, 3)
+                results["scenarios"]["upload"]["documents_per_sec"] = round(len(job_ids) / elapsed, 2)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--scenario", choices=["login", "ask", "mixed", "upload", "all"], default="all")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--corpus", help="directory written by benchmarks.corpus")
+    parser.add_argument("--domain-id", help="domain to ask questions against")
+    parser.add_argument("--domain-name", help="domain to upload documents into")
+    parser.add_argument("--search-mode", choices=["vector", "hybrid"], default="vector")
+    parser.add_argument("--ask-path", default="/questions/ask")
+    parser.add_argument("--admin-email")
+    parser.add_argument("--admin-password")
+    parser.add_argument("--wait-ingest", action="store_true", help="also time uploads until all jobs are ready")
+    parser.add_argument("--out", help="write results JSON here")
+    args = parser.parse_args()
+    results = asyncio.run(main(args))
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
@@ -0,0 +1,31 @@
+import json
+import httpx
+import pytest
+from benchmarks.fake_ollama import create_app
+from benchmarks.corpus import generate
+from benchmarks.load import percentile, summarize
+from app.services.ollama_client import OllamaClient
+
+
+@pytest.mark.asyncio
+async def test_fake_ollama_streams_tokens_with_usage():
+    app = create_app(dim=8, embed_latency_ms=0, first_token_ms=0, tokens_per_sec=0, answer_tokens=5)
+    client = OllamaClient(transport=httpx.ASGITransport(app=app))
+    lines = [json.loads(line) async for line in client.stream_lines(
+        "http://ollama/api/generate", json={"model": "m", "prompt": "context " * 40, "stream": True})]
+    assert len(lines) == 6 and lines[-1]["done"]
+    assert lines[-1]["eval_count"] == 5 and lines[-1]["prompt_eval_count"] > 0
+    first = (await client.post("http://ollama/api/embed", json={"input": ["a", "b"]})).json()["embeddings"]
+    again = (await client.post("http://ollama/api/embeddings", json={"prompt": "a"})).json()["embedding"]
+    assert len(first) == 2 and first[0] == again  # deterministic per text
+    await client.close()
+
+
+def test_corpus_is_seeded_and_stats_use_nearest_rank():
+    assert generate(6, 3, seed=7) == generate(6, 3, seed=7)
+    assert generate(6, 3, seed=7) != generate(6, 3, seed=8)
+    values = [i / 1000 for i in range(1, 101)]
+    assert percentile(values, 50) == 0.05
+    assert percentile(values, 99) == 0.099
+    report = summarize(values, errors=2, elapsed=2.0)
+    assert report["requests"] == 102 and report["rps"] == 50.0 and report["p95_ms"] == 95.0
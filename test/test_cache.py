@@ -0,0 +1,92 @@
+import pytest
+from app.services.cache import TTLCache, QueryEmbeddingCache, SemanticAnswerCache
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(maxsize=2, ttl=-1)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+@pytest.mark.asyncio
+async def test_query_cache_normalizes_and_drops_on_model_change():
+    cache = QueryEmbeddingCache(maxsize=10, ttl=60)
+    await cache.set("nomic-embed-text", "What is the  HR policy?", [0.1, 0.2])
+    assert await cache.get("nomic-embed-text", "what is the hr policy?") == [0.1, 0.2]
+    assert await cache.get("mxbai-embed-large", "what is the hr policy?") is None
+    # Switching back does not resurrect vectors from before the model change
+    assert await cache.get("nomic-embed-text", "what is the hr policy?") is None
+    assert cache.stats == {"l1_hits": 1, "l2_hits": 0, "misses": 2}
+
+@pytest.mark.asyncio
+async def test_answer_cache_matches_similar_questions_and_invalidates():
+    cache = SemanticAnswerCache(threshold=0.95, max_per_domain=10, ttl=60, enabled=True)
+    payload = {"answer": "20 days", "confidence": 0.9, "source_docs": []}
+    _, generation = await cache.get("hr", [1.0, 0.0, 0.0])
+    await cache.set("hr", [1.0, 0.0, 0.0], payload, generation)
+    hit, _ = await cache.get("hr", [0.99, 0.05, 0.0])
+    assert hit == payload
+    miss, _ = await cache.get("hr", [0.0, 1.0, 0.0])
+    assert miss is None
+    other_domain, _ = await cache.get("tech", [1.0, 0.0, 0.0])
+    assert other_domain is None
+    await cache.invalidate("hr")
+    stale, _ = await cache.get("hr", [1.0, 0.0, 0.0])
+    assert stale is None
+    # An answer generated before the invalidation is not stored
+    await cache.set("hr", [1.0, 0.0, 0.0], payload, generation)
+    assert (await cache.get("hr", [1.0, 0.0, 0.0]))[0] is None
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+async def test_answer_cache_picks_best_unexpired_match(backend, monkeypatch):
+    from app.services import cache as cache_module
+    if backend == "python":
+        monkeypatch.setattr(cache_module, "np", None)
+    else:
+        pytest.importorskip("numpy")
+    cache = SemanticAnswerCache(threshold=0.9, max_per_domain=10, ttl=60, enabled=True)
+    _, generation = await cache.get("hr", [1.0, 0.0])
+    await cache.set("hr", [1.0, 0.3], {"answer": "close"}, generation)
+    await cache.set("hr", [1.0, 0.05], {"answer": "closest"}, generation)
+    assert (await cache.get("hr", [1.0, 0.0]))[0] == {"answer": "closest"}
+    # Entries added after a lookup are visible to the next one
+    await cache.set("hr", [0.0, 1.0], {"answer": "other"}, generation)
+    assert (await cache.get("hr", [0.1, 1.0]))[0] == {"answer": "other"}
+    cache.ttl = -1
+    await cache.set("hr", [1.0, 0.0], {"answer": "expired"}, generation)
+    assert (await cache.get("hr", [1.0, 0.0]))[0] == {"answer": "closest"}
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+async def test_answer_cache_survives_embedding_model_change(backend, monkeypatch):
+    from app.services import cache as cache_module
+    if backend == "python":
+        monkeypatch.setattr(cache_module, "np", None)
+    else:
+        pytest.importorskip("numpy")
+    cache = SemanticAnswerCache(threshold=0.9, max_per_domain=10, ttl=60, enabled=True)
+    _, generation = await cache.get("hr", [1.0] * 4)
+    await cache.set("hr", [1.0] * 4, {"answer": "old model"}, generation)
+    assert (await cache.get("hr", [1.0] * 8))[0] is None
+    await cache.set("hr", [1.0] * 8, {"answer": "new model"}, generation)
+    assert (await cache.get("hr", [1.0] * 8))[0] == {"answer": "new model"}
+    assert len(cache._domains["hr"][1]) == 1
+
+
+@pytest.mark.asyncio
+async def test_answer_cache_prunes_expired_entries():
+    cache = SemanticAnswerCache(threshold=0.9, max_per_domain=10, ttl=-1, enabled=True)
+    _, generation = await cache.get("hr", [1.0, 0.0])
+    await cache.set("hr", [1.0, 0.0], {"answer": "a"}, generation)
+    await cache.set("hr", [0.0, 1.0], {"answer": "b"}, generation)
+    assert len(cache._domains["hr"][1]) == 1
+    assert (await cache.get("hr", [0.0, 1.0]))[0] is None
+    assert cache._domains["hr"][1] == []
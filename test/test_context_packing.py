@@ -0,0 +1,29 @@
+from app.services.context_packing import TokenEstimator, pack_context
+
+
+def chunk(chunk_id, text, vector):
+    return {"chunk_id": chunk_id, "chunk_text": text, "document_id": "d", "distance": 0.1, "vector": vector}
+
+
+def test_pack_context_drops_near_duplicates_and_skips_oversized_chunks():
+    estimator = TokenEstimator(chars_per_token=4.0)
+    chunks = [
+        chunk("a", "Leave requests need manager approval. " * 4, [1.0, 0.0, 0.0]),
+        # Overlapping split of the same passage
+        chunk("b", "Leave requests need manager approval. " * 4 + "Submit them early.", [0.99, 0.05, 0.0]),
+        chunk("c", "x" * 2000, [0.0, 1.0, 0.0]),  # does not fit the remaining budget
+        chunk("d", "Holiday carry-over is capped at ten days.", [0.0, 0.0, 1.0]),
+    ]
+    packed, report = pack_context(chunks, budget_tokens=120, estimator=estimator)
+    assert [c["chunk_id"] for c in packed] == ["a", "d"]
+    assert all("vector" not in c for c in packed)
+    assert report["duplicates"] == 1 and report["over_budget"] == 1
+    assert report["saved_tokens"] == report["candidate_tokens"] - report["packed_tokens"] > 500
+
+
+def test_token_estimator_calibrates_towards_observed_ratio():
+    estimator = TokenEstimator(chars_per_token=4.0, alpha=0.5)
+    for _ in range(10):
+        estimator.calibrate(3000, 1000)
+    assert abs(estimator.chars_per_token - 3.0) < 0.01
+    assert estimator.count("x" * 300) == 100
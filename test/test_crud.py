@@ -0,0 +1,61 @@
+import uuid
+import pytest
+from datetime import datetime, timezone
+from sqlalchemy.dialects import postgresql
+from app.db import models
+from app.utils import crud
+
+
+def test_cursor_round_trip():
+    ts = datetime(2025, 9, 1, 12, 30, tzinfo=timezone.utc)
+    row_id = uuid.uuid4()
+    assert crud.decode_cursor(crud.encode_cursor(ts, row_id)) == (ts, row_id)
+    with pytest.raises(ValueError):
+        crud.decode_cursor("not-a-cursor")
+
+
+def test_documents_query_is_projected_keyset_page():
+    cursor = crud.encode_cursor(datetime(2025, 9, 1, tzinfo=timezone.utc), uuid.uuid4())
+    query = crud.documents_query(cursor, domain_id=str(uuid.uuid4()), status="ready", tags=["hr"])
+    sql = str(query.compile(dialect=postgresql.dialect()))
+    # The content body is never loaded for listings
+    assert "documents.content" not in sql
+    assert "(documents.uploaded_at, documents.id) <" in sql
+    assert "documents.tags @>" in sql
+    assert sql.strip().endswith("ORDER BY documents.uploaded_at DESC, documents.id DESC")
+
+
+class DeleteSession:
+    """Records statements; the document lookup returns `doc`."""
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.calls = []
+
+    async def execute(self, stmt):
+        self.calls.append(("execute", str(stmt.compile(dialect=postgresql.dialect()))))
+        return self
+
+    def scalars(self):
+        return self
+
+    def first(self):
+        return self.doc
+
+    async def delete(self, obj):
+        self.calls.append(("delete", obj))
+
+    async def commit(self):
+        self.calls.append(("commit", None))
+
+
+@pytest.mark.asyncio
+async def test_delete_document_removes_its_chunks():
+    doc = models.Document(id=uuid.uuid4(), title="t", content="")
+    db = DeleteSession(doc)
+    assert await crud.delete_document(db, str(doc.id))
+    # Search never joins documents, so the chunks must be deleted, not orphaned
+    kinds = [kind for kind, _ in db.calls]
+    assert kinds == ["execute", "execute", "delete", "commit"]
+    assert db.calls[1][1].startswith("DELETE FROM document_embeddings WHERE document_embeddings.document_id =")
+    assert db.calls[2][1] is doc
@@ -0,0 +1,20 @@
+import pytest
+from app.db import database
+
+
+def test_engine_options_for_asyncpg():
+    options = database.engine_options("postgresql+asyncpg://u:p@db/knowledgehub")
+    assert options["echo"] is False
+    assert options["pool_pre_ping"] is True
+    connect_args = options["connect_args"]
+    assert connect_args["server_settings"]["statement_timeout"] == str(database.DB_STATEMENT_TIMEOUT_MS)
+    assert connect_args["statement_cache_size"] == database.DB_PREPARED_STATEMENT_CACHE_SIZE
+
+
+@pytest.mark.asyncio
+async def test_read_session_reuses_primary_session_without_replica():
+    # No DATABASE_READ_URL: reads stay on the caller's session
+    assert database.read_engine is database.engine
+    sentinel = object()
+    async with database.read_session(sentinel) as session:
+        assert session is sentinel
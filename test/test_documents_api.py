@@ -0,0 +1,107 @@
+import io
+import json
+import os
+import uuid
+import zipfile
+import pytest
+import httpx
+from types import SimpleNamespace
+from fastapi import FastAPI
+from app.api import documents
+from app.services import ingest_jobs
+from app.db.database import get_db
+from app.utils.security import get_current_user
+
+ADMIN = {"id": str(uuid.uuid4()), "role_id": None, "role": {"name": "admin", "permissions": []}}
+
+
+class FakeDB:
+    def __init__(self, domain=None):
+        self.domain = domain
+        self.added = []
+        self.commits = 0
+
+    async def execute(self, stmt):
+        return SimpleNamespace(scalar_one_or_none=lambda: self.domain)
+
+    def add_all(self, objs):
+        self.added.extend(objs)
+
+    async def commit(self):
+        self.commits += 1
+
+
+@pytest.fixture
+def api(monkeypatch):
+    db = FakeDB()
+    enqueued = []
+
+    async def enqueue_ingest(document_id, path, user_id=None, incremental=False):
+        enqueued.append((document_id, path, incremental))
+
+    monkeypatch.setattr(documents, "enqueue_ingest", enqueue_ingest)
+    app = FastAPI()
+    app.include_router(documents.router, prefix="/documents")
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_current_user] = lambda: ADMIN
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    return SimpleNamespace(client=client, db=db, enqueued=enqueued)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("incremental", [False, True])
+async def test_retry_keeps_the_ingest_mode(api, monkeypatch, incremental):
+    doc = SimpleNamespace(id=uuid.uuid4(), status="failed", ingest_incremental=incremental)
+
+    async def get_document_by_id(db, doc_id):
+        return doc
+    monkeypatch.setattr(documents.crud, "get_document_by_id", get_document_by_id)
+    monkeypatch.setattr(documents, "find_upload", lambda document_id: "/uploads/v2.txt")
+    response = await api.client.post(f"/documents/jobs/{doc.id}/retry")
+    assert response.status_code == 202
+    # A failed replacement is retried incrementally, so the old version stays searchable
+    assert api.enqueued == [(str(doc.id), "/uploads/v2.txt", incremental)]
+    await api.client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_bulk_upload_reports_each_file_and_enqueues_only_saved_ones(api, monkeypatch, tmp_path):
+    monkeypatch.setattr(ingest_jobs, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(ingest_jobs, "BULK_MAX_FILE_BYTES", 16)
+    api.db.domain = SimpleNamespace(id=uuid.uuid4())
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("policies/leave.txt", "20 days")
+        zf.writestr("manifest.json", json.dumps({"leave.txt": {"title": "Leave policy", "tags": ["hr"]}}))
+    response = await api.client.post("/documents/upload/bulk", data={"domain_name": "HR"}, files=[
+        ("files", ("small.txt", b"ok", "text/plain")),
+        ("files", ("huge.txt", b"x" * 64, "text/plain")),
+        ("archive", ("docs.zip", archive.getvalue(), "application/zip")),
+    ])
+    assert response.status_code == 202
+    body = response.json()
+    assert body["domain_id"] == str(api.db.domain.id)
+    assert (body["accepted"], body["failed"]) == (2, 1)
+    items = {item["filename"]: item for item in body["items"]}
+    assert items["small.txt"]["status"] == "queued" and items["small.txt"]["error"] is None
+    assert items["leave.txt"]["status"] == "queued"
+    assert items["huge.txt"]["status"] == "failed"
+    assert "exceeds 16 bytes" in items["huge.txt"]["error"]
+    # Every file got a row; the one that could not be saved is marked failed
+    docs = {doc.title: doc for doc in api.db.added}
+    assert {title: doc.status for title, doc in docs.items()} == {"small": "queued", "huge": "failed", "Leave policy": "queued"}
+    assert docs["Leave policy"].tags == ["hr"]
+    # Only saved files are handed to ingest workers
+    assert sorted(os.path.basename(path) for _, path, _ in api.enqueued) == ["leave.txt", "small.txt"]
+    assert {document_id for document_id, _, _ in api.enqueued} == {items["small.txt"]["document_id"], items["leave.txt"]["document_id"]}
+    assert not os.path.exists(os.path.join(str(tmp_path), items["huge.txt"]["document_id"], "huge.txt"))
+    await api.client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_bulk_upload_rejects_unknown_domain(api):
+    response = await api.client.post("/documents/upload/bulk", data={"domain_name": "Nope"},
+                                     files=[("files", ("a.txt", b"a", "text/plain"))])
+    assert response.status_code == 400
+    assert api.db.added == [] and api.enqueued == []
+    await api.client.aclose()
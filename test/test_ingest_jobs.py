@@ -0,0 +1,177 @@
+import asyncio
+import pytest
+from app.services.ingest_jobs import InProcessWorkerPool
+
+@pytest.mark.asyncio
+async def test_inprocess_pool_runs_jobs_with_bounded_concurrency():
+    running = 0
+    peak = 0
+    done = []
+
+    async def handler(document_id, path, user_id=None):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        if document_id == "bad":
+            running -= 1
+            raise RuntimeError("ingest failed")
+        done.append(document_id)
+        running -= 1
+
+    pool = InProcessWorkerPool(handler, workers=2)
+    for doc_id in ["a", "bad", "b", "c"]:
+        await pool.enqueue(doc_id, "/tmp/file.txt")
+    await pool.queue.join()
+    await pool.stop()
+    # A failing job does not take down the worker
+    assert sorted(done) == ["a", "b", "c"]
+    assert peak == 2
+
+@pytest.mark.asyncio
+async def test_save_upload_replaces_previous_version(tmp_path, monkeypatch):
+    import io
+    from types import SimpleNamespace
+    from app.services import ingest_jobs
+    monkeypatch.setattr(ingest_jobs, "UPLOAD_DIR", str(tmp_path))
+    await ingest_jobs.save_upload(SimpleNamespace(filename="v1.txt", file=io.BytesIO(b"one")), "doc")
+    path = await ingest_jobs.save_upload(SimpleNamespace(filename="v2.txt", file=io.BytesIO(b"two")), "doc")
+    # Retries and re-ingestion must pick up the latest file
+    assert ingest_jobs.find_upload("doc") == path
+    assert open(path, "rb").read() == b"two"
+
+def test_bulk_archive_reads_manifest_and_enforces_size_limit(tmp_path, monkeypatch):
+    import io
+    import json
+    import zipfile
+    from app.services import ingest_jobs
+    monkeypatch.setattr(ingest_jobs, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(ingest_jobs, "BULK_MAX_FILE_BYTES", 10)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("manifest.json", json.dumps([{"filename": "a.txt", "title": "Policy A", "tags": ["hr"]}]))
+        zf.writestr("docs/a.txt", "small")
+        zf.writestr("docs/b.txt", "x" * 100)
+    archive, manifest, members = ingest_jobs.open_bulk_archive(buf)
+    assert manifest["a.txt"]["title"] == "Policy A"
+    assert [m.filename for m in members] == ["docs/a.txt", "docs/b.txt"]
+    results = ingest_jobs.save_bulk_files([("d1", "a.txt", members[0]), ("d2", "b.txt", members[1])], archive)
+    assert open(results[0]).read() == "small"
+    # An oversized member fails on its own without affecting the batch
+    assert isinstance(results[1], ValueError)
+    assert ingest_jobs.find_upload("d2") is None
+
+@pytest.mark.asyncio
+async def test_failed_ingest_removes_partially_stored_chunks(monkeypatch):
+    import uuid
+    from types import SimpleNamespace
+    from app.services import ingest_jobs
+    doc = SimpleNamespace(id=uuid.uuid4(), status="queued", domain_id=None)
+    log = []
+
+    class Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def get(self, model, key):
+            return doc
+
+        async def execute(self, stmt):
+            log.append(f"delete {stmt.table.name}")
+
+        async def commit(self):
+            log.append("commit")
+
+        async def rollback(self):
+            log.append("rollback")
+
+    async def ingest_document(db, document, file, user_id=None, path=None):
+        log.append("batch committed")
+        raise RuntimeError("embedding failed")
+
+    async def set_status(document_id, status):
+        log.append(status)
+
+    monkeypatch.setattr(ingest_jobs, "SessionLocal", Session)
+    monkeypatch.setattr(ingest_jobs, "ingest_document", ingest_document)
+    monkeypatch.setattr(ingest_jobs, "set_status", set_status)
+    with pytest.raises(RuntimeError):
+        await ingest_jobs.run_ingest_job(str(doc.id), "/tmp/file.txt")
+    assert log[-4:] == ["rollback", "delete document_embeddings", "commit", "failed"]
+
+@pytest.mark.asyncio
+async def test_interrupted_jobs_are_requeued_on_startup(monkeypatch):
+    from types import SimpleNamespace
+    from app.services import ingest_jobs
+    docs = [
+        SimpleNamespace(id="a", status="embedding", ingest_incremental=False),
+        SimpleNamespace(id="b", status="queued", ingest_incremental=False),
+        SimpleNamespace(id="c", status="parsing", ingest_incremental=True),
+    ]
+    enqueued = []
+
+    class Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def execute(self, stmt):
+            return self
+
+        def scalars(self):
+            return self
+
+        def all(self):
+            return docs
+
+        async def commit(self):
+            pass
+
+    async def enqueue_ingest(document_id, path, user_id=None, incremental=False):
+        enqueued.append((document_id, path, incremental))
+
+    monkeypatch.setattr(ingest_jobs, "SessionLocal", Session)
+    monkeypatch.setattr(ingest_jobs, "enqueue_ingest", enqueue_ingest)
+    monkeypatch.setattr(ingest_jobs, "find_upload", lambda document_id: None if document_id == "b" else f"/tmp/{document_id}.txt")
+    assert await ingest_jobs.recover_interrupted_jobs() == 2
+    # A content replacement resumes incrementally, keeping the old version searchable
+    assert enqueued == [("a", "/tmp/a.txt", False), ("c", "/tmp/c.txt", True)]
+    # Without its upload a job can never finish; failed lets it be re-uploaded or deleted
+    assert [d.status for d in docs] == ["queued", "failed", "queued"]
+
+
+def test_worker_job_closes_loop_bound_clients_even_on_failure(monkeypatch):
+    # Each Celery task gets a fresh event loop: nothing bound to the old one may survive it
+    from app import worker
+    from app.db import database
+    from app.services import cache, ingest_jobs
+    from app.services.ollama_client import ollama_client
+    closed = []
+
+    class FakeRedis:
+        async def aclose(self):
+            closed.append("redis")
+
+    async def run_ingest_job(document_id, path, user_id=None, incremental=False):
+        raise RuntimeError("ingest failed")
+
+    async def close():
+        closed.append("ollama")
+
+    async def dispose_engines():
+        closed.append("engines")
+
+    monkeypatch.setattr(ingest_jobs, "run_ingest_job", run_ingest_job)
+    monkeypatch.setattr(ollama_client, "close", close)
+    monkeypatch.setattr(database, "dispose_engines", dispose_engines)
+    for _ in range(2):
+        monkeypatch.setattr(cache, "_redis", FakeRedis())
+        with pytest.raises(RuntimeError):
+            asyncio.run(worker._run_job("doc", "/tmp/doc.txt"))
+        assert cache._redis is None
+    assert closed == ["ollama", "redis", "engines"] * 2
@@ -0,0 +1,268 @@
+import uuid
+import pytest
+from types import SimpleNamespace
+from app.services import ingest_pipeline
+from app.services.ingest_pipeline import hash_chunk
+
+MODEL = "nomic-embed-text"
+
+
+class FakeSession:
+    """Answers SELECTs from `results` (one entry per query, in order) and records writes."""
+
+    def __init__(self, results=()):
+        self.results = list(results)
+        self.writes = []
+
+    async def execute(self, stmt):
+        if stmt.is_select:
+            return FakeResult(self.results.pop(0))
+        self.writes.append(stmt)
+        return SimpleNamespace(rowcount=0)
+
+    async def commit(self):
+        pass
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def scalars(self):
+        return self
+
+
+@pytest.fixture
+def embedded(monkeypatch):
+    monkeypatch.setenv("OLLAMA_EMBEDDING_MODEL", MODEL)
+    calls = []
+
+    async def embed_chunks(chunks):
+        calls.append(list(chunks))
+        # "fail" stands in for a chunk whose embedding call fell back to zeros
+        return [[0.0, 0.0] if chunk == "fail" else [float(len(chunk)), 1.0] for chunk in chunks]
+    monkeypatch.setattr(ingest_pipeline, "embed_chunks", embed_chunks)
+    return calls
+
+
+def cached_hashes(db):
+    # Multi-row VALUES are keyed by Column objects
+    return [value for stmt in db.writes for row in stmt._multi_values[0]
+            for column, value in row.items() if getattr(column, "key", column) == "chunk_hash"]
+
+
+@pytest.mark.asyncio
+async def test_cache_hits_skip_ollama_and_duplicates_are_embedded_once(embedded):
+    db = FakeSession([[(hash_chunk("known", MODEL), [9.0, 9.0])]])
+    vectors, hashes, hits = await ingest_pipeline.embed_chunks_cached(db, ["known", "new", "new", "known"])
+    assert embedded == [["new"]]
+    assert hits == 2
+    assert vectors == [[9.0, 9.0], [3.0, 1.0], [3.0, 1.0], [9.0, 9.0]]
+    assert hashes[1] == hashes[2] == hash_chunk("new", MODEL)
+    assert cached_hashes(db) == [hash_chunk("new", MODEL)]
+
+
+@pytest.mark.asyncio
+async def test_zero_vector_fallback_is_not_cached(embedded):
+    db = FakeSession([[]])
+    vectors, _, hits = await ingest_pipeline.embed_chunks_cached(db, ["fail", "ok"])
+    assert vectors == [[0.0, 0.0], [2.0, 1.0]]
+    assert hits == 0
+    assert cached_hashes(db) == [hash_chunk("ok", MODEL)]
+
+
+@pytest.mark.asyncio
+async def test_document_embedded_with_another_model_is_not_a_duplicate(monkeypatch):
+    monkeypatch.setenv("OLLAMA_EMBEDDING_MODEL", MODEL)
+    document = SimpleNamespace(id=uuid.uuid4())
+    source = SimpleNamespace(id=uuid.uuid4())
+    current = SimpleNamespace(chunk_text="policy", chunk_hash=hash_chunk("policy", MODEL))
+    stale = SimpleNamespace(chunk_text="policy", chunk_hash=hash_chunk("policy", "all-minilm"))
+    assert await ingest_pipeline.find_duplicate_document(FakeSession([[source], [current]]), document, "h") is source
+    assert await ingest_pipeline.find_duplicate_document(FakeSession([[source], [stale]]), document, "h") is None
+    assert await ingest_pipeline.find_duplicate_document(FakeSession([[]]), document, "h") is None
+
+
+@pytest.mark.asyncio
+async def test_copy_embeddings_is_one_server_side_insert_select():
+    from sqlalchemy.dialects import postgresql
+    db = FakeSession()
+    source = SimpleNamespace(id=uuid.uuid4())
+    document = SimpleNamespace(id=uuid.uuid4(), domain_id=uuid.uuid4())
+    await ingest_pipeline.copy_embeddings(db, source, document)
+    (stmt,) = db.writes
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert sql.startswith("INSERT INTO document_embeddings (id, document_id, domain_id, chunk_text, chunk_hash, vector, chunk_tsv) SELECT")
+    assert "WHERE document_embeddings.document_id = " in sql
+
+
+@pytest.mark.asyncio
+async def test_ingest_report_cache_hit_rate(embedded, monkeypatch, tmp_path):
+    path = tmp_path / "policy.txt"
+    path.write_text("irrelevant: chunks are stubbed")
+
+    async def iter_document_chunks(path, filename=None):
+        yield ["known", "new"]
+        yield ["new", "other"]
+
+    async def no_duplicate(db, document, content_hash):
+        return None
+    monkeypatch.setattr(ingest_pipeline, "iter_document_chunks", iter_document_chunks)
+    monkeypatch.setattr(ingest_pipeline, "find_duplicate_document", no_duplicate)
+    monkeypatch.setattr(ingest_pipeline, "EMBED_BATCH_SIZE", 1)
+    monkeypatch.setattr(ingest_pipeline, "EMBED_CONCURRENCY", 2)
+    document = SimpleNamespace(id=uuid.uuid4(), domain_id=uuid.uuid4(), content_hash=None, status="parsing")
+    # Two flushes of two chunks; the second sees "new" in the cache written by the first
+    db = FakeSession([[(hash_chunk("known", MODEL), [9.0, 9.0])], [(hash_chunk("new", MODEL), [3.0, 1.0])]])
+    report = await ingest_pipeline.ingest_document(db, document, None, path=str(path))
+    assert report["chunks"] == 4
+    assert report["cache_hits"] == 2
+    assert report["cache_hit_rate"] == 0.5
+    assert embedded == [["new"], ["other"]]
+
+
+@pytest.mark.asyncio
+async def test_embed_chunks_keeps_order_and_bounds_concurrency(monkeypatch):
+    import asyncio
+    import json
+    import httpx
+    from app.services.ollama_client import OllamaClient
+    monkeypatch.setenv("OLLAMA_BASE_URL", "http://ollama")
+    monkeypatch.setenv("OLLAMA_EMBEDDING_MODEL", MODEL)
+    in_flight = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        inputs = json.loads(request.content)["input"]
+        # Later batches answer first, so order must come from the batch position
+        await asyncio.sleep(0.03 - 0.003 * int(inputs[0]))
+        in_flight -= 1
+        return httpx.Response(200, json={"embeddings": [[1.0, float(text)] for text in inputs]})
+
+    client = OllamaClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(ingest_pipeline, "ollama_client", client)
+    chunks = [str(i) for i in range(10)]
+    vectors = await ingest_pipeline.embed_chunks(chunks, batch_size=2, concurrency=3)
+    assert vectors == [ingest_pipeline.normalize_embedding([1.0, float(i)]) for i in range(10)]
+    assert peak == 3
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_embed_falls_back_to_single_prompt_endpoint(monkeypatch):
+    import json
+    import httpx
+    from app.services.ollama_client import OllamaClient
+    monkeypatch.setenv("OLLAMA_BASE_URL", "http://ollama")
+    monkeypatch.setenv("OLLAMA_EMBEDDING_MODEL", MODEL)
+    paths = []
+
+    def handler(request):
+        paths.append(request.url.path)
+        if request.url.path == "/api/embed":
+            return httpx.Response(404)  # Ollama before 0.3
+        return httpx.Response(200, json={"embedding": [0.0, float(len(json.loads(request.content)["prompt"]))]})
+
+    client = OllamaClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(ingest_pipeline, "ollama_client", client)
+    assert await ingest_pipeline.embed_chunks(["a", "bb", "ccc"], batch_size=3) == [[0.0, 1.0]] * 3
+    assert paths == ["/api/embed", "/api/embeddings", "/api/embeddings", "/api/embeddings"]
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_queries_and_documents_share_endpoint_and_scale(monkeypatch):
+    import math
+    import httpx
+    from app.services import rag_pipeline
+    from app.services.cache import QueryEmbeddingCache
+    from app.services.ollama_client import OllamaClient
+    monkeypatch.setenv("OLLAMA_BASE_URL", "http://ollama")
+    monkeypatch.setenv("OLLAMA_EMBEDDING_MODEL", MODEL)
+    paths = []
+
+    def handler(request):
+        paths.append(request.url.path)
+        if request.url.path == "/api/embed":
+            return httpx.Response(404)
+        return httpx.Response(200, json={"embedding": [3.0, 4.0]})  # raw, not unit-length
+
+    client = OllamaClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(ingest_pipeline, "ollama_client", client)
+    monkeypatch.setattr(rag_pipeline, "query_embedding_cache", QueryEmbeddingCache())
+    document_vector = (await ingest_pipeline.embed_chunks(["policy"]))[0]
+    query_vector = await rag_pipeline.get_query_embedding("policy")
+    assert document_vector == query_vector == [0.6, 0.8]
+    assert paths == ["/api/embed", "/api/embeddings"] * 2
+    # A raw vector cached before normalization is rescaled on the way out
+    await rag_pipeline.query_embedding_cache.set(MODEL, "leave", [0.0, 2.0])
+    assert math.isclose(sum(x * x for x in await rag_pipeline.get_query_embedding("leave")), 1.0)
+    await client.close()
+
+
+class SwapSession(FakeSession):
+    """FakeSession that also records the order of writes and commits."""
+
+    def __init__(self, results=()):
+        super().__init__(results)
+        self.events = []
+
+    async def execute(self, stmt):
+        if not stmt.is_select:
+            self.events.append(f"{type(stmt).__name__.lower()} {stmt.table.name}")
+        return await super().execute(stmt)
+
+    async def commit(self):
+        self.events.append("commit")
+
+
+@pytest.fixture
+def new_version(embedded, monkeypatch, tmp_path):
+    path = tmp_path / "policy-v2.txt"
+    path.write_text("version 2")
+
+    async def iter_document_chunks(path, filename=None):
+        yield ["A", "B"]
+        yield ["D", "D"]
+    monkeypatch.setattr(ingest_pipeline, "iter_document_chunks", iter_document_chunks)
+    return str(path)
+
+
+@pytest.mark.asyncio
+async def test_reingest_diffs_chunk_hashes_and_swaps_in_one_transaction(new_version, embedded):
+    document = SimpleNamespace(id=uuid.uuid4(), domain_id=uuid.uuid4(), content_hash="v1", version=1, status="queued")
+    stored = [(1, hash_chunk("A", MODEL)), (2, hash_chunk("A", MODEL)), (3, hash_chunk("B", MODEL)),
+              (4, hash_chunk("C", MODEL)), (5, None)]
+    db = SwapSession([stored, []])
+    report = await ingest_pipeline.reingest_document(db, document, new_version)
+    # One stored "A" and "B" are kept; the second "A", "C" and the unhashed row go
+    assert (report["reused"], report["added"], report["removed"]) == (2, 2, 3)
+    assert report["chunks"] == 4
+    # A chunk repeated in the new version is embedded once but stored twice
+    assert embedded == [["D"]]
+    (delete_stmt,) = [w for w in db.writes if w.table.name == "document_embeddings" and not hasattr(w, "_multi_values")]
+    removed = sorted(delete_stmt.compile().params["id_1"])
+    assert removed[0] in (1, 2) and removed[1:] == [4, 5]
+    inserted = [w for w in db.writes if w.table.name == "document_embeddings" and hasattr(w, "_multi_values")]
+    assert len(inserted[0]._multi_values[0]) == 2
+    assert document.version == 2 and document.content_hash != "v1"
+    # Status commit, then delete + insert + version bump committed together
+    assert db.events == ["commit", "insert embedding_cache", "delete document_embeddings", "insert document_embeddings", "commit"]
+
+
+@pytest.mark.asyncio
+async def test_reingest_of_identical_file_changes_nothing(new_version):
+    document = SimpleNamespace(id=uuid.uuid4(), content_hash=ingest_pipeline.hash_file(new_version), version=3)
+    db = SwapSession()
+    report = await ingest_pipeline.reingest_document(db, document, new_version)
+    assert report["unchanged"] and document.version == 3
+    assert db.events == []
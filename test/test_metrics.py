@@ -0,0 +1,19 @@
+from app.services.metrics import record_ollama_usage, render_metrics
+from app.services.rag_pipeline import stage_timer
+
+
+def test_stage_and_token_metrics_are_exported():
+    timings = {}
+    with stage_timer(timings, "search_vector"):
+        pass
+    record_ollama_usage("generate", "llama3", {
+        "response": "ok", "done": True, "prompt_eval_count": 412, "eval_count": 57,
+        "prompt_eval_duration": 250_000_000, "eval_duration": 1_100_000_000, "total_duration": 1_400_000_000,
+    })
+    body = render_metrics().decode()
+    assert "search_vector" in timings
+    assert 'knowledgehub_stage_seconds_count{pipeline="rag",stage="search_vector"}' in body
+    assert 'knowledgehub_ollama_tokens_total{endpoint="generate",kind="prompt",model="llama3"} 412.0' in body
+    assert 'knowledgehub_ollama_seconds_sum{endpoint="generate",model="llama3",phase="eval"} 1.1' in body
+    assert 'knowledgehub_cache_events_total{cache="answer",outcome="hits"}' in body
+    assert 'knowledgehub_write_behind_queue_depth{writer="audit"} 0.0' in body
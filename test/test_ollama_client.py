@@ -0,0 +1,116 @@
+import time
+import pytest
+import httpx
+from app.services.ollama_client import OllamaClient, OllamaUnavailableError
+
+@pytest.mark.asyncio
+async def test_retries_transient_errors():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"embedding": [0.1]})
+
+    client = OllamaClient(max_retries=2, backoff_base=0, transport=httpx.MockTransport(handler))
+    response = await client.post("http://ollama/api/embeddings", json={"prompt": "hi"})
+    assert response.status_code == 200
+    assert len(calls) == 3
+    assert client.breaker.state == "closed"
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_fails_fast():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ConnectError("connection refused")
+
+    client = OllamaClient(max_retries=0, breaker_threshold=2, breaker_reset=60, transport=httpx.MockTransport(handler))
+    for _ in range(2):
+        with pytest.raises(OllamaUnavailableError):
+            await client.post("http://ollama/api/generate", json={})
+    assert client.breaker.state == "open"
+    # Open breaker rejects without touching the network
+    with pytest.raises(OllamaUnavailableError):
+        await client.post("http://ollama/api/generate", json={})
+    assert len(calls) == 2
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_stream_lines_yields_ndjson_lines():
+    body = b'{"response": "Hel", "done": false}\n{"response": "lo", "done": false}\n{"response": "", "done": true}\n'
+
+    def handler(request):
+        return httpx.Response(200, content=body)
+
+    client = OllamaClient(transport=httpx.MockTransport(handler))
+    lines = [line async for line in client.stream_lines("http://ollama/api/generate", json={"stream": True})]
+    assert len(lines) == 3
+    assert '"Hel"' in lines[0]
+    await client.close()
+
+def test_half_open_breaker_lets_one_probe_through():
+    from app.services.ollama_client import CircuitBreaker
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    # Everyone else fails fast while the probe is in flight
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+@pytest.mark.asyncio
+async def test_half_open_breaker_sends_one_request_to_a_dead_server():
+    import asyncio
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(0.02)
+        raise httpx.ConnectError("connection refused")
+
+    client = OllamaClient(max_retries=1, backoff_base=0, breaker_threshold=1, breaker_reset=0.05,
+                          transport=httpx.MockTransport(handler))
+    with pytest.raises(OllamaUnavailableError):
+        await client.post("http://ollama/api/generate", json={})
+    await asyncio.sleep(0.06)
+    calls.clear()
+    results = await asyncio.gather(
+        *(client.post("http://ollama/api/generate", json={}) for _ in range(5)), return_exceptions=True
+    )
+    assert all(isinstance(r, OllamaUnavailableError) for r in results)
+    # Only the probe reached the network; its failure re-opened the breaker, so no retry
+    assert len(calls) == 1
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_generation_read_timeout_is_not_retried_and_each_attempt_counts():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        if request.url.path == "/api/generate":
+            raise httpx.ReadTimeout("timed out")
+        raise httpx.ConnectError("connection refused")
+
+    client = OllamaClient(max_retries=2, backoff_base=0, breaker_threshold=10, transport=httpx.MockTransport(handler))
+    with pytest.raises(OllamaUnavailableError):
+        await client.post("http://ollama/api/generate", json={}, retry_read_timeout=False)
+    assert calls == ["/api/generate"]
+    # Connection errors are still retried, and every failed attempt reaches the breaker
+    with pytest.raises(OllamaUnavailableError):
+        await client.post("http://ollama/api/embed", json={})
+    assert len(calls) == 4
+    assert client.breaker.failures == 4
+    await client.close()
@@ -0,0 +1,153 @@
+import json
+import uuid
+import pytest
+import httpx
+from types import SimpleNamespace
+from fastapi import FastAPI
+from app.api import questions
+from app.db.database import get_db
+from app.services import write_behind
+from app.services.ollama_client import OllamaUnavailableError
+from app.services.rag_pipeline import RagContext, RagResult, NO_DOCUMENTS_ANSWER
+from app.utils.security import get_current_user
+
+USER = {"id": str(uuid.uuid4()), "role_id": None}
+CHUNKS = [{"document_id": "d1", "content": "Leave is 20 days."}]
+
+
+class FakeSession:
+    def __init__(self, log):
+        self.log = log
+
+    async def commit(self):
+        self.log.append("commit")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def sse(monkeypatch):
+    # Everything the stream touches is stubbed; `log` records the order of tokens and writes
+    state = SimpleNamespace(log=[], saved=[], context=None, tokens=["Leave ", "is ", "20 days."], fail_after=None)
+
+    async def prepare_context(db, question, domain_id, **kwargs):
+        return state.context
+
+    async def generate_answer_stream(chunks, question):
+        for i, token in enumerate(state.tokens):
+            if state.fail_after == i:
+                raise OllamaUnavailableError("model server down")
+            state.log.append("token")
+            yield token
+
+    async def finish_answer(domain_id, context, answer, confidence, source_docs):
+        return RagResult(answer, confidence, source_docs)
+
+    async def insert_rows(db, rows):
+        state.log.append("insert")
+        state.saved.extend(rows)
+
+    monkeypatch.setattr(questions, "prepare_context", prepare_context)
+    monkeypatch.setattr(questions, "generate_answer_stream", generate_answer_stream)
+    monkeypatch.setattr(questions, "finish_answer", finish_answer)
+    monkeypatch.setattr(questions, "estimate_confidence", lambda answer: 0.9)
+    monkeypatch.setattr(questions, "insert_rows", insert_rows)
+    monkeypatch.setattr(questions, "SessionLocal", lambda: FakeSession(state.log))
+    monkeypatch.setattr(questions, "ASK_WRITE_BEHIND", False)
+    monkeypatch.setattr(write_behind, "AUDIT_LOG_ENABLED", False)
+    app = FastAPI()
+    app.include_router(questions.router, prefix="/questions")
+    app.dependency_overrides[get_db] = lambda: None
+    app.dependency_overrides[get_current_user] = lambda: USER
+    state.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+    async def ask():
+        response = await state.client.post("/questions/ask/stream", json={
+            "user_id": USER["id"], "domain_id": str(uuid.uuid4()), "question_text": "How much leave?"
+        })
+        await state.client.aclose()
+        return response
+    state.ask = ask
+    return state
+
+
+def answer_row(saved):
+    return next(values for model, values in saved if model.__name__ == "Answer")
+
+
+@pytest.mark.asyncio
+async def test_stream_sends_tokens_then_one_citations_event_after_saving(sse):
+    sse.context = RagContext([1.0, 0.0], CHUNKS, 0)
+    response = await sse.ask()
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    assert [name for name, _ in events] == ["token", "token", "token", "citations"]
+    assert "".join(data["text"] for name, data in events if name == "token") == "Leave is 20 days."
+    # The exchange is written once generation has finished, in one transaction
+    assert sse.log == ["token", "token", "token", "insert", "commit"]
+    citations = events[-1][1]
+    saved = answer_row(sse.saved)
+    assert citations["answer_id"] == str(saved["id"])
+    assert citations["question_id"] == str(saved["question_id"])
+    assert saved["answer_text"] == "Leave is 20 days."
+    assert citations["source_docs"] == CHUNKS
+    assert citations["cached"] is False
+
+
+@pytest.mark.asyncio
+async def test_stream_serves_a_cached_answer_without_generating(sse):
+    cached = RagResult("Cached answer.", 0.8, CHUNKS, cached=True)
+    sse.context = RagContext([1.0, 0.0], CHUNKS, 0, cached=cached)
+    events = parse_sse((await sse.ask()).text)
+    assert events[0] == ("token", {"text": "Cached answer."})
+    assert [name for name, _ in events] == ["token", "citations"]
+    assert events[-1][1]["cached"] is True
+    assert sse.log == ["insert", "commit"]
+    assert answer_row(sse.saved)["answer_text"] == "Cached answer."
+
+
+@pytest.mark.asyncio
+async def test_stream_without_documents_answers_and_escalates(sse):
+    sse.context = RagContext([1.0, 0.0], [], 0)
+    events = parse_sse((await sse.ask()).text)
+    assert events[0] == ("token", {"text": NO_DOCUMENTS_ANSWER})
+    assert [name for name, _ in events] == ["token", "citations"]
+    assert events[-1][1]["confidence"] == 0.0
+    assert "token" not in sse.log
+    # Zero confidence is below the escalation threshold
+    assert {model.__name__ for model, _ in sse.saved} == {"Question", "Answer", "Escalation"}
+
+
+@pytest.mark.asyncio
+async def test_stream_sends_error_event_and_saves_nothing_when_ollama_drops(sse):
+    sse.context = RagContext([1.0, 0.0], CHUNKS, 0)
+    sse.fail_after = 1
+    response = await sse.ask()
+    assert response.status_code == 200
+    events = parse_sse(response.text)
+    assert events == [("token", {"text": "Leave "}), ("error", {"detail": "Answer service temporarily unavailable"})]
+    assert sse.saved == []
+    assert "commit" not in sse.log
+
+
+@pytest.mark.asyncio
+async def test_stream_maps_retrieval_outage_to_503(sse, monkeypatch):
+    async def prepare_context(db, question, domain_id, **kwargs):
+        raise OllamaUnavailableError("model server down")
+    monkeypatch.setattr(questions, "prepare_context", prepare_context)
+    response = await sse.ask()
+    assert response.status_code == 503
+    assert sse.saved == []
@@ -0,0 +1,37 @@
+import pytest
+from app.services.rerankers import ScoreReranker, get_reranker
+
+@pytest.mark.asyncio
+async def test_score_reranker_promotes_exact_term_matches():
+    chunks = [
+        {"chunk_id": "1", "chunk_text": "General troubleshooting steps for printers.", "distance": 0.40},
+        {"chunk_id": "2", "chunk_text": "Reset the router before calling support.", "distance": 0.45},
+        {"chunk_id": "3", "chunk_text": "Error E-4012 means the toner cartridge is missing.", "distance": 0.50},
+    ]
+    reranked = await ScoreReranker(vector_weight=0.5).rerank(chunks, "What does error E-4012 mean?", top_k=2)
+    assert [c["chunk_id"] for c in reranked] == ["3", "1"]
+
+def test_get_reranker_defaults_to_cpu_backend():
+    assert get_reranker("some-domain").name == "score"
+
+@pytest.mark.asyncio
+async def test_configured_rerankers_are_built_off_the_event_loop(monkeypatch):
+    import threading
+    from app.services import rerankers
+    built = []
+
+    class SlowModel(rerankers.ScoreReranker):
+        name = "slow-model"
+
+        def __init__(self):
+            super().__init__()
+            built.append(threading.current_thread() is threading.main_thread())
+
+    monkeypatch.setattr(rerankers, "RERANKERS", dict(rerankers.RERANKERS, **{"slow-model": SlowModel}))
+    monkeypatch.setattr(rerankers, "RERANKER_BY_DOMAIN", {"it": "slow-model"})
+    monkeypatch.setattr(rerankers, "_instances", {})
+    await rerankers.warm_rerankers()
+    assert built == [False]
+    # Requests reuse the instance built at startup
+    assert isinstance(rerankers.get_reranker("it"), SlowModel)
+    assert built == [False]
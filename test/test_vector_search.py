@@ -0,0 +1,90 @@
+import pytest
+from types import SimpleNamespace
+from sqlalchemy.dialects import postgresql
+from app.services import rag_pipeline
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, stmt):
+        self.statements.append(str(stmt.compile(dialect=postgresql.dialect())))
+        return self
+
+    def all(self):
+        return []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("precision, coarse", [
+    ("halfvec", "AS HALFVEC(768)) <-> CAST("),
+    ("binary", "AS BIT(768)) <~> binary_quantize(CAST("),
+])
+async def test_compact_search_reranks_candidates_at_full_precision(precision, coarse):
+    db = RecordingSession()
+    query = [0.1] * rag_pipeline.VECTOR_DIM
+    await rag_pipeline.vector_search(db, "q", "domain", top_k=5, query_embedding=query, precision=precision)
+    *params, sql = db.statements
+    # ef_search is widened so the index can return every candidate
+    assert len(params) == 1
+    assert sql.startswith("WITH candidates AS MATERIALIZED")
+    assert coarse in sql
+    assert "JOIN candidates ON candidates.id = document_embeddings.id" in sql
+    assert sql.rstrip().endswith("ORDER BY document_embeddings.vector <-> %(vector_1)s \n LIMIT %(param_3)s::INTEGER")
+
+
+@pytest.mark.asyncio
+async def test_full_precision_search_is_unchanged():
+    db = RecordingSession()
+    await rag_pipeline.vector_search(db, "q", "domain", query_embedding=[0.1] * rag_pipeline.VECTOR_DIM, precision="full")
+    assert db.statements and "candidates" not in db.statements[-1]
+    with pytest.raises(ValueError):
+        rag_pipeline.coarse_distance("int8", [0.1])
+
+
+def hit(chunk_id):
+    return {"chunk_id": chunk_id, "chunk_text": chunk_id}
+
+
+def test_rrf_prefers_chunks_ranked_by_both_lists():
+    vector_hits = [hit("v1"), hit("both"), hit("v3")]
+    lexical_hits = [hit("l1"), hit("l2"), hit("both")]
+    fused = rag_pipeline.reciprocal_rank_fusion([vector_hits, lexical_hits], top_k=3)
+    assert [c["chunk_id"] for c in fused] == ["both", "v1", "l1"]
+    assert fused[0]["rrf_score"] == round(1 / 62 + 1 / 63, 6)
+    assert len(rag_pipeline.reciprocal_rank_fusion([vector_hits, lexical_hits], top_k=2)) == 2
+
+
+class SearchSession(RecordingSession):
+    """Returns the vector or the lexical rows depending on the query, as (embedding, distance)."""
+
+    def __init__(self, vector_ids, lexical_ids):
+        super().__init__()
+        self.vector_ids = vector_ids
+        self.lexical_ids = lexical_ids
+        self.rows = []
+
+    async def execute(self, stmt):
+        await super().execute(stmt)
+        ids = self.lexical_ids if "@@" in self.statements[-1] else self.vector_ids
+        self.rows = [(SimpleNamespace(id=i, chunk_text=i, document_id="d", vector=None), 0.5) for i in ids]
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def all(self):
+        return self.rows
+
+
+@pytest.mark.asyncio
+async def test_hybrid_search_fuses_vector_and_lexical_results(monkeypatch):
+    db = SearchSession(["v1", "both"], ["E-4012", "both"])
+    monkeypatch.setattr(rag_pipeline, "ReadSessionLocal", lambda: db)
+    fused = await rag_pipeline.hybrid_search(db, "error E-4012", "domain", top_k=3, query_embedding=[0.1] * rag_pipeline.VECTOR_DIM)
+    assert [c["chunk_id"] for c in fused] == ["both", "v1", "E-4012"]
+    assert any("@@ websearch_to_tsquery" in sql for sql in db.statements)
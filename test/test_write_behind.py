@@ -0,0 +1,135 @@
+import asyncio
+import pytest
+from app.db.models import Question, Answer
+from app.services.write_behind import BatchWriter
+
+
+class FakeSession:
+    def __init__(self, log, poison=None):
+        self.log = log
+        self.poison = poison
+        self.pending = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, stmt):
+        if self.poison and any(self.poison in values.values() for values in stmt._multi_values[0]):
+            raise ValueError("foreign key violation")
+        self.pending.append((stmt.table.name, len(stmt._multi_values[0])))
+
+    async def commit(self):
+        self.log.append(self.pending)
+
+
+@pytest.mark.asyncio
+async def test_batch_writer_groups_submissions_into_few_transactions():
+    commits = []
+    writer = BatchWriter("test", batch_size=50, interval=0.05, session_factory=lambda: FakeSession(commits))
+    writer.start()
+    for i in range(120):
+        await writer.submit([(Question, {"question_text": f"q{i}"}), (Answer, {"answer_text": f"a{i}"})])
+    await asyncio.sleep(0.2)
+    await writer.stop()
+    assert writer.stats["written"] == 120
+    assert len(commits) <= 4
+    # One multi-row INSERT per table per transaction, parents first
+    assert [table for table, _ in commits[0]] == ["questions", "answers"]
+    assert sum(n for tx in commits for table, n in tx if table == "answers") == 120
+
+
+@pytest.mark.asyncio
+async def test_stop_writes_the_batch_being_collected():
+    commits = []
+    writer = BatchWriter("test", batch_size=50, interval=5.0, session_factory=lambda: FakeSession(commits))
+    writer.start()
+    for i in range(5):
+        await writer.submit([(Question, {"question_text": f"q{i}"})])
+    await asyncio.sleep(0.05)  # the background task now holds all five, waiting for more
+    assert writer.queue.empty()
+    await writer.stop()
+    assert writer.stats["written"] == 5
+    assert commits == [[("questions", 5)]]
+
+
+@pytest.mark.asyncio
+async def test_batch_writer_writes_directly_when_queue_is_full():
+    commits = []
+    writer = BatchWriter("test", max_queue=1, session_factory=lambda: FakeSession(commits))
+    writer.start()
+    await writer.submit([(Question, {"question_text": "a"})])
+    await writer.submit([(Question, {"question_text": "b"})])
+    await writer.stop()
+    assert writer.stats["written"] == 2
+    assert writer.stats["direct"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failing_submission_does_not_discard_its_batch():
+    commits = []
+    writer = BatchWriter("test", batch_size=50, interval=0.05, session_factory=lambda: FakeSession(commits, poison="bad"))
+    writer.start()
+    for text in ["q0", "q1", "bad", "q3"]:
+        await writer.submit([(Question, {"question_text": text}), (Answer, {"answer_text": text})])
+    await writer.stop()
+    assert writer.stats["written"] == 3
+    assert writer.stats["failed"] == 1
+    # The batch failed as a whole, then each submission got its own transaction
+    assert commits == [[("questions", 1), ("answers", 1)]] * 3
+
+
+@pytest.mark.asyncio
+async def test_audit_events_are_batched_and_dropped_when_full(monkeypatch):
+    from app.services import write_behind
+    from app.utils.logging import log_action
+    commits = []
+    writer = BatchWriter("audit", batch_size=100, interval=0.01, max_queue=3,
+                         session_factory=lambda: FakeSession(commits), drop_when_full=True)
+    monkeypatch.setattr(write_behind, "audit_writer", writer)
+    writer.start()
+    for _ in range(5):
+        await log_action("00000000-0000-0000-0000-000000000001", "login", "not-a-uuid")
+    assert writer.metrics()["queue_depth"] == 3
+    await writer.stop()
+    assert writer.stats["dropped"] == 2
+    assert writer.stats["written"] == 3
+    assert commits == [[("audit_logs", 3)]]
+
+
+@pytest.mark.asyncio
+async def test_audit_event_for_deleted_user_only_loses_itself(monkeypatch):
+    import uuid
+    from app.services import write_behind
+    from app.utils.logging import log_action
+    deleted = uuid.UUID("00000000-0000-0000-0000-0000000000de")
+    commits = []
+    writer = BatchWriter("audit", batch_size=200, interval=0.01,
+                         session_factory=lambda: FakeSession(commits, poison=deleted), drop_when_full=True)
+    monkeypatch.setattr(write_behind, "audit_writer", writer)
+    writer.start()
+    for user_id in ["00000000-0000-0000-0000-000000000001", str(deleted), "00000000-0000-0000-0000-000000000002"]:
+        await log_action(user_id, "ask_question", None)
+    await writer.stop()
+    assert writer.stats["written"] == 2
+    assert writer.stats["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_audit_events_are_written_on_clean_shutdown(monkeypatch):
+    from app.services import write_behind
+    from app.utils.logging import log_action
+    commits = []
+    # Production interval: a second of events is in hand when the app stops
+    writer = BatchWriter("audit", batch_size=200, interval=1.0,
+                         session_factory=lambda: FakeSession(commits), drop_when_full=True)
+    monkeypatch.setattr(write_behind, "audit_writer", writer)
+    writer.start()
+    for _ in range(3):
+        await log_action("00000000-0000-0000-0000-000000000001", "login", None)
+    await asyncio.sleep(0.05)
+    await writer.stop()
+    assert writer.stats["written"] == 3
+    assert commits == [[("audit_logs", 3)]]